@@ -1,427 +1,110 @@
+import os
+from pathlib import Path
+
 import streamlit as st
+
+st.set_page_config(layout='wide')
+# El título sale antes de importar pandas, pyarrow y plotly.
+st.title("Ejecución")
+
 import pandas as pd
-import matplotlib.pyplot as plt
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
-from io import BytesIO
 
-months = [
-    "Ene", "Feb", "Mar", "Abr", "May", "Jun",
-    "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"
-]
+from ejecucion import (arbol, cubo, datos, exportar, graficos, instantanea, medicion, perdidas,
+                       proyeccion)
 
-st.set_page_config(layout='wide')
+medicion.configurar()
+medicion.iniciar()
+plotly_chart = medicion.tramo('enviar figura')(st.plotly_chart)
 
-df = pd.read_csv('ejecucion_agosto.csv')
 
-total_ap = (df.groupby('mes_num')['APR. VIGENTE'].sum() / 1_000_000_000_000).round(1)
-total_ej = (df.groupby('mes_num')['OBLIGACION'].sum() / 1_000_000_000_000).round(1)
-total_co = (df.groupby('mes_num')['COMPROMISO'].sum() / 1_000_000_000_000).round(1)
-total_ej_perc = (df.groupby('mes_num')['perc_ejecucion'].sum() * 100).round(1)
-total_co_perc = (df.groupby('mes_num')['perc_compr'].sum() * 100).round(1)
+@st.cache_resource
+def refresco():
+    from ejecucion import refresco
+    return refresco.iniciar()
 
-st.title("Ejecución")
 
-sectores = df['Sector'].unique().tolist()
-entidades = df['Entidad'].unique().tolist()
+if os.environ.get('EJECUCION_REFRESCO'):
+    refresco()
 
-tab1, tab2, tab3 = st.tabs(["Vista general",
-                            "Navegación detallada",
-                            "Descarga de datos"])
+with medicion.tramo('cargar'):
+    # Toda esta ejecución lee la misma versión de los datos.
+    datos.fijar()
 
-with tab1:
-    col1, col2, col3, col4, col5 = st.columns(5)
-    with col1:
-        st.metric("Apr. Vigente (bil)", total_ap[8])
-    with col2: 
-        st.metric("Ejecutado (bil)", total_ej[8])
-    with col3:
-        st.metric("Comprometido (bil)", total_co[8])
-    with col4:
-        st.metric("% ejecutado (al mes actual)", total_ej_perc[8])
-    with col5:
-        st.metric("% comprometido (al mes actual)", total_co_perc[8])
-
-    fig = make_subplots(rows=1, cols=2, subplot_titles=("Valores (billones)", "Porcentaje (%)"))
-
-    mean_growth_rate = (total_ej.loc[8] / 8)
-    forecast_values = [mean_growth_rate * i  for i in range(9, 13)]
-    full_values_ej = list(total_ej.values) + forecast_values
-    full_values_ej = [round(i, 1) for i in full_values_ej]
-    fig.add_trace(go.Scatter(x=months[:9], 
-                             y=full_values_ej[:9], 
-                             mode='lines+markers',
-                            name='Ejecutado', showlegend=False,
-                            line=dict(color='#dd722a')), row=1, col=1)
-
-    # Highlight the forecasted part with a red dashed line (the last 4 points)
-    fig.add_trace(go.Scatter(
-        x=months[8:],  # x-axis for forecasted values
-        y=full_values_ej[8:],     # The forecasted values
-        mode='lines+markers',          # Just lines (no markers here)
-        name='Pronóstico', 
-        line=dict(color='#81D3CD', width=2, dash='dash'),
-        marker=dict(color='#81D3CD', size=8),  # Dashed line for forecast
-    ), row=1, col=1)
-
-    mean_growth_rate = (total_co.loc[8] / 8)
-    forecast_values = [mean_growth_rate * i  for i in range(9, 13)]
-    full_values_co = list(total_co.values) + forecast_values
-    full_values_co = [round(i, 1) for i in full_values_co]
-
-
-    fig.add_trace(go.Scatter(x=months[:9], 
-                             y=full_values_co[:9], 
-                             mode='lines+markers', 
-                             name='Comprometido', showlegend=False,
-                             line=dict(color='#2635bf')), row=1, col=1)
-    fig.add_trace(go.Scatter(
-        x=months[8:],  # x-axis for forecasted values
-        y=full_values_co[8:],     # The forecasted values
-        mode='lines+markers',          # Just lines (no markers here)
-        name='Pronóstico', showlegend=False,
-        line=dict(color='#81D3CD', width=2, dash='dash'),
-        marker=dict(color='#81D3CD', size=8),  # Dashed line for forecast
-    ), row=1, col=1)
-
-    fig.add_shape(type='line', x0=0, x1=11, y0=total_ap[8], y1=total_ap[8], line=dict(color='#2635bf', dash='dash'),
-                row=1, col=1)
+    ejec = cubo.cargar()
+    proy = proyeccion.cargar()
+    perd = perdidas.cargar()
+    arb = arbol.cargar()
+    corte = proy.corte
 
-    
-    mean_growth_rate = (total_ej_perc.loc[8] / 8)
-    forecast_values = [mean_growth_rate * i  for i in range(9, 13)]
-    full_values_perc = list(total_ej_perc.values) + forecast_values
-    full_values_perc = [round(i, 1) for i in full_values_perc]
-
-    fig.add_trace(go.Scatter(x=months[:9], 
-                             y=full_values_perc[:9], 
-                             mode='lines+markers', 
-                             name='Ejecutado', 
-                             line=dict(color='#dd722a')), row=1, col=2)
-
-    fig.add_trace(go.Scatter(
-        x=months[8:],  # x-axis for forecasted values
-        y=full_values_perc[8:],     # The forecasted values
-        mode='lines+markers',          # Just lines (no markers here)
-        name='Pronóstico', showlegend=False,
-        line=dict(color='#81D3CD', width=2, dash='dash'),
-        marker=dict(color='#81D3CD', size=8),  # Dashed line for forecast
-    ), row=1, col=2)
-
-
-
-    mean_growth_rate = (total_co_perc.loc[8] / 8)
-    forecast_values = [mean_growth_rate * i  for i in range(9, 13)]
-    full_values_co = list(total_co_perc.values) + forecast_values
-    full_values_co = [round(i, 1) for i in full_values_co]
-
-    fig.add_trace(go.Scatter(x=months[:9], 
-                             y=full_values_co[:9], 
-                             mode='lines+markers', 
-                             name='Comprometido', 
-                             line=dict(color='#2635bf')),  row=1, col=2)
-    fig.add_trace(go.Scatter(
-        x=months[8:],  # x-axis for forecasted values
-        y=full_values_co[8:],     # The forecasted values
-        mode='lines+markers',          # Just lines (no markers here)
-        name='Pronóstico', showlegend=False,
-        line=dict(color='#81D3CD', width=2, dash='dash'),
-        marker=dict(color='#81D3CD', size=8),  # Dashed line for forecast
-    ), row=1, col=2)
-
-    fig.add_shape(type='line', x0=0, x1=11, y0=100, y1=100, line=dict(color='#2635bf', dash='dash'),
-                row=1, col=2)
-
-    fig.update_layout(
-        title="Ejecución y compromiso general al mes de agosto",
-        height=400, 
-        width=900,
-        legend=dict(
-            orientation='h',   # Horizontal legend
-            x=0.64,             # Center the legend
-            y=1.1,             # Position it slightly above the plots
-            xanchor='left',  # Center the legend horizontally
-            yanchor='bottom'   # Align the legend vertically
-        )
-    )
-    st.plotly_chart(fig)
-
-    perd_aprop = 100 - full_values_co[-1]
+sectores = ejec.opciones('Sector')
+entidades = ejec.opciones('Entidad')
 
-    if perd_aprop > 0:
-        st.error(f"Hay una pérdida de apropiación del {round(perd_aprop, 2)}%.")
+tab1, tab2, tab3, tab4 = st.tabs(["Vista general",
+                                  "Navegación detallada",
+                                  "Clasificador de gastos",
+                                  "Descarga de datos"])
+
+with tab1, medicion.tramo('Vista general'):
+    # Lo de arriba es igual para todos: se entrega la página armada en el ETL.
+    # Se sirve como archivo estático (ver .streamlit/config.toml), para que el
+    # navegador la guarde en caché.
+    estatica = instantanea.ACTIVA and st.get_option('server.enableStaticServing')
+    vista = instantanea.cargar() if estatica else None
+    if vista is not None and vista.vigente(ejec, proy, perd):
+        base = st.get_option('server.baseUrlPath').strip('/')
+        st.iframe('/' + '/'.join(filter(None, [base, 'app/static', instantanea.estatica(vista)])),
+                  height=vista.alto)
     else:
-        st.success(f"No hay pérdida de apropiación.")
-
-    piv_s = (df[df['mes_num'] == 8].pivot_table(index='Sector',
-                                   values=['APR. VIGENTE','OBLIGACION', 'COMPROMISO'],
-                                   aggfunc='sum')
-                                .assign(perc_ejecucion=lambda x: (x['OBLIGACION'] / x['APR. VIGENTE'] * 100).round(1),
-                                        perc_compr=lambda x: (x['COMPROMISO'] / x['APR. VIGENTE'] * 100).round(1)))
-    tops_ejec = piv_s.sort_values(by='perc_ejecucion', ascending=True).tail(10).reset_index()
-    tops_compr = piv_s.sort_values(by='perc_compr', ascending=True).tail(10).reset_index()
-
-    fig = make_subplots(rows=1, cols=2, subplot_titles=("Ejecutado (%)", "Comprometido (%)"))
-
-# Plot absolute values as bar plots in the first subplot
-    fig.add_trace(go.Bar(y=tops_ejec['Sector'], 
-                         x=tops_ejec['perc_ejecucion'], 
-                         name='Ejecutado', 
-                         marker_color='#F7B261', 
-                         orientation='h',
-                        text=tops_ejec['Sector'],
-                        textposition='inside',
-                        hoverinfo='x'), row=1, col=1)
-    fig.add_trace(go.Bar(y=tops_compr['Sector'], 
-                         x=tops_compr['perc_compr'], 
-                         name='Comprometido', 
-                         marker_color='#81D3CD', 
-                         orientation='h',
-                        text=tops_compr['Sector'],
-                        textposition='inside',
-                        hoverinfo='x'), row=1, col=2)
-    fig.add_shape(
-        type='line',
-        x0=100, x1=100, y0=-0.5, y1=9.5,  # Set x0, x1 for the vertical line position
-        line=dict(color='#dd722a', width=1, dash='dash'),
-        row=1, col=1
-    )
-    fig.add_shape(
-        type='line',
-        x0=100, x1=100, y0=-0.5, y1=9.5,  # Set x0, x1 for the vertical line position
-        line=dict(color='#81D3CD', width=1, dash='dash'),
-        row=1, col=2
-    )
-    fig.update_yaxes(showticklabels=False)
-    fig.update_layout(
-        title="Top 10 sectores por ejecución (al mes de agosto) ",
-        height=400, 
-        width=900,
-        legend=dict(
-            orientation='h',   # Horizontal legend
-            x=0.72,             # Center the legend
-            y=1.1,             # Position it slightly above the plots
-            xanchor='left',  # Center the legend horizontally
-            yanchor='bottom'   # Align the legend vertically
-        )
-    )
-    st.plotly_chart(fig)
-
-    piv_e = (df[df['mes_num'] == 8].pivot_table(index='Entidad',
-                                   values=['APR. VIGENTE','OBLIGACION', 'COMPROMISO'],
-                                   aggfunc='sum')
-                                .assign(perc_ejecucion=lambda x: (x['OBLIGACION'] / x['APR. VIGENTE'] * 100).round(1),
-                                        perc_compr=lambda x: (x['COMPROMISO'] / x['APR. VIGENTE'] * 100).round(1))
-                                .assign(perc_perdida=lambda x:100 - x['perc_compr']))
-    tops_ejec = piv_e.sort_values(by='perc_ejecucion', ascending=True).tail(10).reset_index()
-    tops_compr = piv_e.sort_values(by='perc_compr', ascending=True).tail(10).reset_index()
-    tops_perd = piv_e.sort_values(by='perc_perdida', ascending=True).tail(10).reset_index()
-    bots_ejec = piv_e.sort_values(by='perc_ejecucion', ascending=False).tail(10).reset_index()
-
-
-
-    fig = make_subplots(rows=1, cols=2, subplot_titles=("Ejecutado (%)", "Pérdida de aprop. (%)"))
-
-# Plot absolute values as bar plots in the first subplot
-    fig.add_trace(go.Bar(y=tops_ejec['Entidad'], 
-                         x=tops_ejec['perc_ejecucion'], 
-                         name='Ejecutado', 
-                         marker_color='#F7B261', 
-                         orientation='h',
-                        text=tops_ejec['Entidad'],
-                        textposition='inside',
-                        hoverinfo='x'), row=1, col=1)
-    fig.add_trace(go.Bar(y=tops_compr['Entidad'], 
-                         x=tops_compr['perc_compr'], 
-                         name='Comprometido', 
-                         marker_color='#81D3CD', 
-                         orientation='h',
-                        text=tops_compr['Entidad'],
-                        textposition='inside',
-                        hoverinfo='x'), row=1, col=2)
-    fig.add_shape(
-        type='line',
-        x0=100, x1=100, y0=-0.5, y1=9.5,  # Set x0, x1 for the vertical line position
-        line=dict(color='#dd722a', width=1, dash='dash'),
-        row=1, col=1
-    )
-    fig.add_shape(
-        type='line',
-        x0=100, x1=100, y0=-0.5, y1=9.5,  # Set x0, x1 for the vertical line position
-        line=dict(color='#81D3CD', width=1, dash='dash'),
-        row=1, col=2
-    )
-    fig.update_yaxes(showticklabels=False)
-    fig.update_layout(
-        title="Top 10 entidades por ejecución (al mes de agosto)",
-        height=400, 
-        width=900,
-        legend=dict(
-            orientation='h',   # Horizontal legend
-            x=0.72,             # Center the legend
-            y=1.1,             # Position it slightly above the plots
-            xanchor='left',  # Center the legend horizontally
-            yanchor='bottom'   # Align the legend vertically
-        )
-    )
-    st.plotly_chart(fig)
-
-    fig = make_subplots(rows=1, cols=2, subplot_titles=("Ejecutado (%)", "Comprometido (%)"))
-
-# Plot absolute values as bar plots in the first subplot
-    fig.add_trace(go.Bar(y=bots_ejec['Entidad'], 
-                         x=bots_ejec['perc_ejecucion'], 
-                         name='Ejecutado', 
-                         marker_color='#F7B261', 
-                         orientation='h',
-                        hovertext=bots_ejec['Entidad'],
-                        hoverinfo='x+text'), row=1, col=1)
-    fig.add_trace(go.Bar(y=tops_perd['Entidad'], 
-                         x=tops_perd['perc_compr'], 
-                         name='Pérdida de apropiación', 
-                         marker_color='#81D3CD', 
-                         orientation='h',
-                        hovertext=tops_perd['Entidad'],
-                        hoverinfo='x+text'), row=1, col=2)
-    fig.add_shape(
-        type='line',
-        x0=100, x1=100, y0=-0.5, y1=9.5,  # Set x0, x1 for the vertical line position
-        line=dict(color='#dd722a', width=1, dash='dash'),
-        row=1, col=1
-    )
-    fig.add_shape(
-        type='line',
-        x0=100, x1=100, y0=-0.5, y1=9.5,  # Set x0, x1 for the vertical line position
-        line=dict(color='#81D3CD', width=1, dash='dash'),
-        row=1, col=2
-    )
-    fig.update_yaxes(showticklabels=False)
-    fig.update_layout(
-        title="Top 10 entidades con menor ejecución y mayor pérdida de apropiación (al mes de agosto)",
-        height=400, 
-        width=900,
-        legend=dict(
-            orientation='h',   # Horizontal legend
-            x=0.7,             # Center the legend
-            y=1.1,             # Position it slightly above the plots
-            xanchor='left',  # Center the legend horizontally
-            yanchor='bottom'   # Align the legend vertically
-        )
-    )
-    st.plotly_chart(fig)
+        for col, (etiqueta, valor) in zip(st.columns(5), instantanea.cifras(ejec, corte).items()):
+            with col:
+                st.metric(etiqueta, valor)
+
+        plotly_chart(graficos.general(proy, None, corte))
+
+        vigencias = datos.almacen.vigencias()
+        if len(vigencias) > 1:
+            plotly_chart(graficos.vigencias(datos.almacen.totales(vigencias[-3:])))
+
+        perd_aprop = graficos.perdida(proy)
+
+        if perd_aprop > 0:
+            st.error(f"Hay una pérdida de apropiación del {round(perd_aprop, 2)}%.")
+        else:
+            st.success(f"No hay pérdida de apropiación.")
+
+        plotly_chart(graficos.top_sectores(ejec, None, corte))
+        plotly_chart(graficos.top_entidades(ejec, None, corte))
+        plotly_chart(graficos.rezagadas(ejec, None, corte, perd))
+
+    st.subheader("Mayor pérdida de apropiación proyectada a diciembre")
+    dimension = st.radio("Ver por: ", ['Entidad', 'Sector', 'Unidad'], horizontal=True)
+    peores = perd.top(dimension, 10)
+    st.dataframe(pd.DataFrame({
+        "Apr. Vigente (mmil)": (peores['APR. VIGENTE'] / 1_000_000_000).round(1),
+        "Comprometido a dic. (mmil)": (peores['COMPROMISO'] / 1_000_000_000).round(1),
+        "Pérdida (mmil)": (peores['perdida'] / 1_000_000_000).round(1),
+        "Pérdida (%)": (peores['perc_perdida'] * 100).round(1)}).rename_axis(dimension))
     
-with tab2:
+with tab2, medicion.tramo('Navegación detallada'):
     sector = st.selectbox("Seleccione un sector: ", sectores)
 
-    fil_sector = df[df['Sector'] == sector]
-    piv_sector = (fil_sector.pivot_table(index='mes_num',
-                   aggfunc='sum',
-                   values=['OBLIGACION', 'APR. VIGENTE', 'COMPROMISO'])
-                            .div(1_000_000_000, axis=0)
-                            .assign(perc_ejecucion=lambda x: (x['OBLIGACION'] / x['APR. VIGENTE'] * 100),
-                                    perc_compr=lambda x: x['COMPROMISO'] / x['APR. VIGENTE'] * 100)
-                            .round(1))
+    piv_sector = graficos.mensual(proy, 'Sector', sector)
     
     col1, col2, col3, col4, col5 = st.columns(5)
     with col1:
-        st.metric("Apr. Vigente (mmil)", piv_sector.loc[8, "APR. VIGENTE"])
+        st.metric("Apr. Vigente (mmil)", piv_sector.loc[corte, "APR. VIGENTE"])
     with col2: 
-        st.metric("Ejecutado (mmil)", piv_sector.loc[8, "OBLIGACION"])
+        st.metric("Ejecutado (mmil)", piv_sector.loc[corte, "OBLIGACION"])
     with col3:
-        st.metric("Comprometido (mmil)", piv_sector.loc[8, "COMPROMISO"])
+        st.metric("Comprometido (mmil)", piv_sector.loc[corte, "COMPROMISO"])
     with col4:
-        st.metric("% ejecutado", piv_sector.loc[8, "perc_ejecucion"])
+        st.metric("% ejecutado", piv_sector.loc[corte, "perc_ejecucion"])
     with col5:
-        st.metric("% comprometido", piv_sector.loc[8, "perc_compr"])
-
-
-    mean_growth_rate = (piv_sector.loc[8, "perc_ejecucion"] / 8) / 100
-
-    # Step 2: Forecast the next 4 values
-    last_value = piv_sector['perc_ejecucion'].iloc[-1]
-    forecast_values = [mean_growth_rate * i * 100 for i in range(9, 13)]
-
-    # Combine original and forecasted values
-    full_values = piv_sector['perc_ejecucion'].tolist() + forecast_values
-    full_values = [round(i, 1) for i in full_values]
-
-    # Step 3: Create a line plot
-    fig = make_subplots(rows=1, cols=2, subplot_titles=("Ejecutado (%)", "Comprometido (%)"))
-
-    # Plot the first 8 values (blue solid line)
-    fig.add_trace(go.Scatter(
-        x=months[:9],  # x-axis for all values (1 to 12)
-        y=full_values[:9],         # All values (original + forecast)
-        mode='lines+markers',  # Line and markers
-        name='Observado', showlegend=False,
-        line=dict(color='#2635bf', width=2),  # Solid blue line for all values
-        marker=dict(color=['#2635bf']*9, size=8)  # Red markers for forecasted values
-    ), row=1, col=1)
-
-    # Highlight the forecasted part with a red dashed line (the last 4 points)
-    fig.add_trace(go.Scatter(
-        x=months[8:],  # x-axis for forecasted values
-        y=full_values[8:],     # The forecasted values
-        mode='lines+markers',          # Just lines (no markers here)
-        name='Pronóstico', showlegend=False,
-        line=dict(color='#dd722a', width=2, dash='dash'),
-        marker=dict(color='#dd722a', size=8),  # Dashed line for forecast
-    ), row=1, col=1)
-
-    mean_growth_rate = (piv_sector.loc[8, "perc_compr"] / 8) / 100
-
-    # Step 2: Forecast the next 4 values
-    last_value = piv_sector['perc_compr'].iloc[-1]
-    forecast_values = [mean_growth_rate * i * 100 for i in range(9, 13)]
-
-    # Combine original and forecasted values
-    full_values = piv_sector['perc_compr'].tolist() + forecast_values
-    full_values = [round(i, 1) for i in full_values]
-
-    fig.add_trace(go.Scatter(
-        x=months[:9],  # x-axis for all values (1 to 12)
-        y=full_values[:9],         # All values (original + forecast)
-        mode='lines+markers',  # Line and markers
-        name='Observado',
-        line=dict(color='#2635bf', width=2), # Solid blue line for all values
-        marker=dict(color=['#2635bf']*9, size=8)  # Red markers for forecasted values
-    ), row=1, col=2)
-
-
-
-    # Highlight the forecasted part with a red dashed line (the last 4 points)
-    fig.add_trace(go.Scatter(
-        x=months[8:],  # x-axis for forecasted values
-        y=full_values[8:],     # The forecasted values
-        mode='lines+markers',          # Just lines (no markers here)
-        name='Pronóstico',
-        line=dict(color='#dd722a', width=2, dash='dash'),
-        marker=dict(color='#dd722a', size=8),  # Dashed line for forecast
-    ), row=1, col=2)
-
-    fig.add_shape(type='line', x0=0, x1=11, y0=100, y1=100, line=dict(color='#2635bf', dash='dash'),
-                row=1, col=2)
-    fig.add_shape(type='line', x0=0, x1=11, y0=100, y1=100, line=dict(color='#2635bf', dash='dash'),
-                row=1, col=1)
-    fig.update_yaxes(range=[0, max(100, max(full_values))]) 
-
-    fig.update_layout(
-        title=f"Ejecución y compromiso al mes de agosto por sector: {sector}",
-        height=400, 
-        width=900,
-        legend=dict(
-            orientation='h',
-            yanchor="bottom",
-            y=1.1,
-            xanchor="right",
-            x=1   # Align the legend vertically
-        )
-    )
-
-    # Show the plot
-    st.plotly_chart(fig)
-
-    perd_aprop = 100 - full_values[-1]
+        st.metric("% comprometido", piv_sector.loc[corte, "perc_compr"])
+
+    plotly_chart(graficos.sector(proy, sector, corte))
+
+    perd_aprop = graficos.perdida(proy, 'Sector', sector)
 
     if perd_aprop > 0:
         st.error(f"Hay una pérdida de apropiación del {round(perd_aprop, 2)}% para el sector {sector}.")
@@ -430,113 +113,22 @@ with tab2:
 
 
     entidad = st.selectbox("Seleccione una entidad: ", entidades)
-    fil_entidad = df[df['Entidad'] == entidad]
-    piv_entidad = (fil_entidad.pivot_table(index='mes_num',
-                   aggfunc='sum',
-                   values=['OBLIGACION', 'APR. VIGENTE', 'COMPROMISO'])
-                            .div(1_000_000_000, axis=0)
-                            .assign(perc_ejecucion=lambda x: (x['OBLIGACION'] / x['APR. VIGENTE'] * 100),
-                                    perc_compr=lambda x: x['COMPROMISO'] / x['APR. VIGENTE'] * 100)
-                            .round(1))
+    piv_entidad = graficos.mensual(proy, 'Entidad', entidad)
     col1, col2, col3, col4, col5 = st.columns(5)
     with col1:
-        st.metric("Apr. Vigente (mmil)", piv_entidad.loc[8, "APR. VIGENTE"])
+        st.metric("Apr. Vigente (mmil)", piv_entidad.loc[corte, "APR. VIGENTE"])
     with col2: 
-        st.metric("Ejecutado (mmil)", piv_entidad.loc[8, "OBLIGACION"])
+        st.metric("Ejecutado (mmil)", piv_entidad.loc[corte, "OBLIGACION"])
     with col3:
-        st.metric("Comprometido (mmil)", piv_entidad.loc[8, "COMPROMISO"])
+        st.metric("Comprometido (mmil)", piv_entidad.loc[corte, "COMPROMISO"])
     with col4:
-        st.metric("% ejecutado", piv_entidad.loc[8, "perc_ejecucion"])
+        st.metric("% ejecutado", piv_entidad.loc[corte, "perc_ejecucion"])
     with col5:
-        st.metric("% comprometido", piv_entidad.loc[8, "perc_compr"])
-
-    mean_growth_rate = (piv_entidad.loc[8, "perc_ejecucion"] / 8) / 100
-
-    # Step 2: Forecast the next 4 values
-    last_value = piv_entidad['perc_ejecucion'].iloc[-1]
-    forecast_values = [mean_growth_rate * i * 100 for i in range(9, 13)]
-
-    # Combine original and forecasted values
-    full_values = piv_entidad['perc_ejecucion'].tolist() + forecast_values
-    full_values = [round(i, 1) for i in full_values]
-
-    # Step 3: Create a line plot
-    fig = make_subplots(rows=1, cols=2, subplot_titles=("Ejecutado (%)", "Comprometido (%)"))
-
-    # Plot the first 8 values (blue solid line)
-    fig.add_trace(go.Scatter(
-        x=months[:9],  # x-axis for all values (1 to 12)
-        y=full_values[:9],         # All values (original + forecast)
-        mode='lines+markers',  # Line and markers
-        name='Observado', showlegend=False,
-        line=dict(color='#2635bf', width=2),  # Solid blue line for all values
-        marker=dict(color=['#2635bf']*9, size=8)  # Red markers for forecasted values
-    ), row=1, col=1)
-
-    # Highlight the forecasted part with a red dashed line (the last 4 points)
-    fig.add_trace(go.Scatter(
-        x=months[8:],  # x-axis for forecasted values
-        y=full_values[8:],     # The forecasted values
-        mode='lines+markers',          # Just lines (no markers here)
-        name='Pronóstico', showlegend=False,
-        line=dict(color='#dd722a', width=2, dash='dash'),
-        marker=dict(color='#dd722a', size=8),  # Dashed line for forecast
-    ), row=1, col=1)
-
-    mean_growth_rate = (piv_entidad.loc[8, "perc_compr"] / 8) / 100
-
-    # Step 2: Forecast the next 4 values
-    last_value = piv_entidad['perc_compr'].iloc[-1]
-    forecast_values = [mean_growth_rate * i * 100 for i in range(9, 13)]
-
-    # Combine original and forecasted values
-    full_values = piv_entidad['perc_compr'].tolist() + forecast_values
-    full_values = [round(i, 1) for i in full_values]
-
-    fig.add_trace(go.Scatter(
-        x=months[:9],  # x-axis for all values (1 to 12)
-        y=full_values[:9],         # All values (original + forecast)
-        mode='lines+markers',  # Line and markers
-        name='Observado', showlegend=True,
-        line=dict(color='#2635bf', width=2),  # Solid blue line for all values
-        marker=dict(color=['#2635bf']*9, size=8)  # Red markers for forecasted values
-    ), row=1, col=2)
-
-
-
-    # Highlight the forecasted part with a red dashed line (the last 4 points)
-    fig.add_trace(go.Scatter(
-        x=months[8:],  # x-axis for forecasted values
-        y=full_values[8:],     # The forecasted values
-        mode='lines+markers',          # Just lines (no markers here)
-        name='Pronóstico', showlegend=True,
-        line=dict(color='#dd722a', width=2, dash='dash'),
-        marker=dict(color='#dd722a', size=8),  # Dashed line for forecast
-    ), row=1, col=2)
-
-    fig.add_shape(type='line', x0=0, x1=11, y0=100, y1=100, line=dict(color='#2635bf', dash='dash'),
-                row=1, col=2)
-    fig.add_shape(type='line', x0=0, x1=11, y0=100, y1=100, line=dict(color='#2635bf', dash='dash'),
-                row=1, col=1)
-    fig.update_yaxes(range=[0, max(100, max(full_values))]) 
-
-    fig.update_layout(
-        title=f"Ejecución y compromiso al mes de agosto por entidad: {entidad}",
-        height=400, 
-        width=900,
-        legend=dict(
-            orientation='h',
-            yanchor="bottom",
-            y=1.1,
-            xanchor="right",
-            x=1 # Align the legend vertically
-        )
-    )
-
-    # Show the plot
-    st.plotly_chart(fig)
-
-    perd_aprop = 100 - full_values[-1]
+        st.metric("% comprometido", piv_entidad.loc[corte, "perc_compr"])
+
+    plotly_chart(graficos.entidad(proy, entidad, corte))
+
+    perd_aprop = graficos.perdida(proy, 'Entidad', entidad)
 
     if perd_aprop > 0:
         st.error(f"Hay una pérdida de apropiación del {round(perd_aprop, 2)}% para la entidad {entidad}.")
@@ -544,11 +136,96 @@ with tab2:
         st.success(f"No hay pérdida de apropiación para la entidad {entidad}.")
 
     
-with tab3:
-
-    csv = df.to_csv(index=False).encode('utf-8')
-    st.download_button(
-                label="Descargar CSV",
-                data=csv,
-                file_name='datos_ejecucion_agosto.csv',
-                mime='text/csv')
+with tab3, medicion.tramo('Clasificador de gastos'):
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        entidad_arbol = st.selectbox("Seleccione una entidad: ", entidades, key='entidad_arbol')
+    with col2:
+        mes_arbol = st.selectbox("Mes: ", range(1, corte + 1), index=corte - 1,
+                                 format_func=lambda m: graficos.NOMBRES_MES[m - 1].capitalize())
+    with col3:
+        forma = st.radio("Gráfico: ", ['Treemap', 'Sunburst'], horizontal=True)
+
+    plotly_chart(graficos.arbol(arb, (entidad_arbol, forma), mes_arbol))
+
+    # Se abre un nivel a la vez: cada tabla son los hijos del nodo elegido.
+    padre = arbol.RAIZ
+    for etiqueta in arbol.ETIQUETAS:
+        hijos = arb.hijos(entidad_arbol, mes_arbol, padre)
+        if hijos.empty:
+            break
+        st.subheader(etiqueta)
+        st.dataframe(pd.DataFrame({
+            "Código": hijos['codigo'],
+            "Nombre": hijos['nombre'],
+            "Apr. Vigente (mmil)": (hijos['APR. VIGENTE'] / 1_000_000_000).round(1),
+            "Comprometido (mmil)": (hijos['COMPROMISO'] / 1_000_000_000).round(1),
+            "Ejecutado (mmil)": (hijos['OBLIGACION'] / 1_000_000_000).round(1),
+            "% comprometido": (hijos['perc_compr'] * 100).round(1),
+            "% ejecutado": (hijos['perc_ejecucion'] * 100).round(1)}),
+            hide_index=True)
+        nombres = dict(zip(hijos['id'], hijos['codigo'].where(hijos['nombre'] == hijos['codigo'],
+                                                              hijos['codigo'] + ' ' + hijos['nombre'])))
+        padre = st.selectbox(f"Abrir {etiqueta.lower()}: ", [None] + list(nombres),
+                             format_func=lambda i: '' if i is None else nombres[i],
+                             key=f'abrir_{etiqueta}')
+        if padre is None:
+            break
+
+with tab4, medicion.tramo('Descarga de datos'):
+
+    with st.form("exportacion"):
+        col1, col2 = st.columns(2)
+        with col1:
+            sectores_exp = st.multiselect("Sectores", sectores)
+            meses_exp = st.slider("Meses", 1, 12, (1, 12))
+            formato = st.radio("Formato", list(exportar.FORMATOS), horizontal=True)
+        with col2:
+            entidades_exp = st.multiselect("Entidades", entidades)
+            columnas_exp = st.multiselect("Columnas (todas si no se elige ninguna)",
+                                          exportar.columnas())
+        preparar = st.form_submit_button("Preparar archivo")
+
+    if preparar:
+        # Se guarda la selección y no la ruta: si cambian los datos, el
+        # archivo se vuelve a generar con la nueva versión.
+        st.session_state['archivo_exportado'] = dict(formato=formato,
+                                                     columnas=columnas_exp or None,
+                                                     sectores=sectores_exp,
+                                                     entidades=entidades_exp,
+                                                     meses=meses_exp)
+
+    if 'archivo_exportado' in st.session_state:
+        seleccion = st.session_state['archivo_exportado']
+        extension, mime = exportar.FORMATOS[seleccion['formato']]
+        try:
+            with medicion.tramo('exportar'):
+                ruta = exportar.exportar(**seleccion)
+        except (ValueError, OSError) as e:
+            st.error(str(e))
+        else:
+            # El archivo se lee al hacer clic, no en cada ejecución de la sesión.
+            st.download_button(
+                        label=f"Descargar {seleccion['formato']}",
+                        data=Path(ruta).read_bytes,
+                        file_name=f"datos_ejecucion.{extension}",
+                        mime=mime)
+
+registro = medicion.terminar(cubo=ejec, proyecciones=proy, perdidas=perd, arbol=arb,
+                             **{f'vigencia {anio}': memoria
+                                for anio, memoria in datos.almacen.memoria().items()})
+
+if st.query_params.get('diagnostico'):
+    with st.expander("Diagnóstico de esta ejecución", expanded=True):
+        st.metric("Tiempo total (s)", registro['segundos'])
+        tramos = pd.DataFrame(registro['tramos'])
+        st.dataframe(pd.DataFrame({
+            "Etapa": tramos['nivel'].map(lambda n: '\u2003' * n) + tramos['nombre'],
+            "Desde (s)": tramos['desde'],
+            "Duración (s)": tramos['segundos']}), hide_index=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.dataframe(pd.DataFrame(registro['caches']).T.rename_axis("Caché"))
+        with col2:
+            st.dataframe(pd.Series(registro['memoria'], name="MB")
+                         .div(2**20).round(1).rename_axis("Datos"))
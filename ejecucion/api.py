@@ -0,0 +1,176 @@
+"""API JSON con los agregados del tablero.
+
+Sirve el cubo, las proyecciones y el ranking de pérdida de apropiación, leídos
+con las mismas funciones que usa el tablero, para quien necesite las cifras
+sin abrir una sesión de Streamlit:
+
+- `GET /`: versión de los datos y rutas disponibles.
+- `GET /cubo?por=Sector,mes_num&Sector=...&mes_num=8`: sumas del cubo por las
+  dimensiones de `por`, filtradas por las dimensiones que vengan como
+  parámetro, con los porcentajes de ejecución y compromiso. Los valores son
+  acumulados en el año, así que sumar meses no tiene sentido: si `mes_num` no
+  está en `por` ni en los filtros, se toma el último mes con datos.
+- `GET /proyecciones?dimension=Sector&clave=...&modelo=estacional&mes_num=12`
+- `GET /perdidas?dimension=Entidad&modelo=estacional`
+
+Las listas se paginan con `pagina` (desde 1) y `tamano`. Cada respuesta lleva
+un ETag que depende de la versión de los datos y de la consulta: con
+`If-None-Match` se responde 304 sin cuerpo mientras los datos no cambien. Los
+cuerpos ya armados se guardan en una caché LRU, y las respuestas grandes van
+comprimidas con gzip si el cliente lo acepta.
+
+Uso:
+
+    python -m ejecucion.api [--host 127.0.0.1] [--puerto 8000]
+"""
+import argparse
+import hashlib
+import json
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from . import cubo, datos, perdidas, proyeccion
+
+TAMANO = 500
+TAMANO_MAXIMO = 5000
+TAMANO_CACHE = 256
+GZIP_MINIMO = 1024
+
+respuestas = datos.LRU(TAMANO_CACHE)
+
+
+class ErrorConsulta(ValueError):
+    pass
+
+
+def _lista(texto):
+    return [i for i in texto.split(',') if i]
+
+
+def _opcion(valor, opciones, nombre):
+    if valor not in opciones:
+        raise ErrorConsulta(f"{nombre} debe ser uno de {list(opciones)}, no {valor!r}")
+    return valor
+
+
+def _entero(parametros, nombre, defecto, minimo=1, maximo=None):
+    try:
+        valor = int(parametros.get(nombre, defecto))
+    except ValueError:
+        raise ErrorConsulta(f"{nombre} debe ser un entero") from None
+    if valor < minimo:
+        raise ErrorConsulta(f"{nombre} debe ser al menos {minimo}")
+    if maximo is not None and valor > maximo:
+        raise ErrorConsulta(f"{nombre} debe ser a lo más {maximo}")
+    return valor
+
+
+def tabla_cubo(ejec, parametros):
+    por = _lista(parametros.get('por', 'Sector,mes_num'))
+    for dimension in por:
+        _opcion(dimension, cubo.DIMENSIONES, 'por')
+    df = ejec.df
+    if 'mes_num' not in por and 'mes_num' not in parametros:
+        df = df[df['mes_num'] == ejec.totales.index.max()]
+    for dimension in cubo.DIMENSIONES:
+        if dimension in parametros:
+            valores = _lista(parametros[dimension])
+            if dimension == 'mes_num':
+                valores = [_entero({'mes_num': i}, 'mes_num', i, 1, 12) for i in valores]
+            df = df[df[dimension].isin(valores)]
+    if por:
+        df = df.groupby(por, observed=True, sort=False)[datos.SUMAS].sum().reset_index()
+    else:
+        df = df[datos.SUMAS].sum().to_frame().T
+    return df.assign(perc_ejecucion=df['OBLIGACION'] / df['APR. VIGENTE'],
+                     perc_compr=df['COMPROMISO'] / df['APR. VIGENTE'])
+
+
+def tabla_proyecciones(proy, parametros):
+    dimension = _opcion(parametros.get('dimension', proyeccion.TOTAL),
+                        [proyeccion.TOTAL] + proyeccion.DIMENSIONES, 'dimension')
+    modelo = _opcion(parametros.get('modelo', proy.modelo), proy.modelos, 'modelo')
+    indice = proy.series(dimension, modelo)
+    if 'clave' in parametros:
+        if parametros['clave'] not in indice:
+            raise ErrorConsulta(f"no hay {dimension} {parametros['clave']!r}")
+        df = indice[parametros['clave']].reset_index()
+    else:
+        df = indice.df.reset_index()
+    if 'mes_num' in parametros:
+        df = df[df['mes_num'] == _entero(parametros, 'mes_num', 12, 1, 12)]
+    return df.drop(columns=['dimension', 'modelo'])
+
+
+def tabla_perdidas(perd, parametros):
+    dimension = _opcion(parametros.get('dimension', 'Entidad'), proyeccion.DIMENSIONES,
+                        'dimension')
+    # Sin filas no hay modelos; el de por omisión da una lista vacía.
+    modelo = _opcion(parametros.get('modelo', perd.modelo), perd.modelos or [perd.modelo],
+                     'modelo')
+    return perd.top(dimension, perdidas.K, modelo).reset_index()
+
+
+def _cuerpo(fuente, tabla, parametros):
+    """Cuerpo JSON de una página de `tabla(fuente, parametros)`."""
+    df = tabla(fuente, parametros)
+    tamano = _entero(parametros, 'tamano', TAMANO, 1, TAMANO_MAXIMO)
+    pagina = _entero(parametros, 'pagina', 1)
+    total = len(df)
+    parte = df.iloc[(pagina - 1) * tamano:pagina * tamano]
+    # to_json convierte NaN en null y las categorías en texto.
+    encabezado = json.dumps({'version': list(fuente.version), 'total': total,
+                             'pagina': pagina, 'tamano': tamano,
+                             'paginas': -(-total // tamano)}, ensure_ascii=False)
+    filas = parte.to_json(orient='records', force_ascii=False)
+    return (encabezado[:-1] + ', "datos": ' + filas + '}').encode()
+
+
+def servir(cargar, tabla):
+    """Ruta que responde `tabla` sobre los datos de `cargar()` con ETag y caché."""
+    def ruta(request):
+        datos.fijar()
+        fuente = cargar()
+        parametros = dict(request.query_params)
+        consulta = json.dumps([request.url.path, list(fuente.version), sorted(parametros.items())])
+        etag = '"' + hashlib.sha1(consulta.encode()).hexdigest()[:20] + '"'
+        encabezados = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in [i.strip() for i in request.headers.get('if-none-match', '').split(',')]:
+            return Response(status_code=304, headers=encabezados)
+        try:
+            cuerpo = respuestas.obtener(etag, lambda: _cuerpo(fuente, tabla, parametros))
+        except ErrorConsulta as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        return Response(cuerpo, media_type='application/json', headers=encabezados)
+    return ruta
+
+
+def inicio(request):
+    base = datos.fijar()
+    return JSONResponse({'version': list(datos.firma(base)),
+                         'rutas': ['/cubo', '/proyecciones', '/perdidas']})
+
+
+app = Starlette(routes=[Route('/', inicio),
+                        Route('/cubo', servir(cubo.cargar, tabla_cubo)),
+                        Route('/proyecciones', servir(proyeccion.cargar, tabla_proyecciones)),
+                        Route('/perdidas', servir(perdidas.cargar, tabla_perdidas))],
+                middleware=[Middleware(GZipMiddleware, minimum_size=GZIP_MINIMO)])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.puerto)
+
+
+if __name__ == '__main__':
+    main()
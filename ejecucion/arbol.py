@@ -0,0 +1,94 @@
+"""Árbol del clasificador de gastos por entidad y mes.
+
+Cada nodo es un prefijo del rubro: tipo de gasto, cuenta, subcuenta, objeto y
+ordinal. Para cada entidad y mes se guardan todos los nodos con sus sumas ya
+acumuladas (las de todos los rubros que cuelgan de él) y lo que corresponde a
+rubros que terminan en ese nivel (`propio`). Los nodos se ordenan por
+(Entidad, mes_num, padre), así que los hijos de un nodo son un slice
+contiguo: abrir un nodo cuesta lo que tenga de hijos, sin reagrupar la tabla.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from . import consultas, datos
+from .catalogo import NIVELES, NOMBRES
+
+ARCHIVO = 'arbol.parquet'
+
+RAIZ = ''
+CAMINO = ['Tipo de gasto'] + NIVELES
+ETIQUETAS = ['Tipo de gasto'] + NOMBRES
+
+
+class Arbol:
+
+    def __init__(self, df, version):
+        self.df = df
+        self.version = version
+        self.hijos_de = datos.Indice(df, ['Entidad', 'mes_num', 'padre'])
+        self.nodos_de = datos.Indice(df, ['Entidad', 'mes_num'])
+
+    def hijos(self, entidad, mes, padre=RAIZ):
+        """Hijos de `padre` (por defecto, los tipos de gasto de la entidad)."""
+        clave = (entidad, mes, padre)
+        if clave not in self.hijos_de:
+            return self.df.iloc[:0]
+        return self.hijos_de[clave]
+
+    def nodos(self, entidad, mes):
+        """Todos los nodos de una entidad en un mes."""
+        if (entidad, mes) not in self.nodos_de:
+            return self.df.iloc[:0]
+        return self.nodos_de[entidad, mes]
+
+
+def nodos(hojas):
+    """Nodos de todos los niveles a partir de las sumas por rubro (`hojas`).
+
+    `hojas` tiene una fila por (Entidad, mes_num, rubro) con las columnas de
+    CAMINO, ETIQUETAS y SUMAS; los niveles que el rubro no tiene van vacíos.
+    """
+    codigos = hojas[CAMINO].astype('object')
+    nombres = hojas[ETIQUETAS].astype('object')
+    # Profundidad de cada rubro: hasta el último nivel con código.
+    profundidad = codigos.notna().to_numpy().cumprod(axis=1).sum(axis=1)
+    padre = pd.Series(RAIZ, index=hojas.index)
+    partes = []
+    for nivel, (columna, etiqueta) in enumerate(zip(CAMINO, ETIQUETAS)):
+        presentes = profundidad > nivel
+        codigo = codigos[columna].fillna('')
+        ruta = codigo if nivel == 0 else padre + '/' + codigo
+        parte = hojas[['Entidad', 'mes_num'] + datos.SUMAS].assign(
+            nivel=nivel,
+            id=ruta,
+            padre=padre,
+            codigo=codigos[columna],
+            nombre=nombres[etiqueta].fillna(codigos[columna]),
+            propio=np.where(profundidad == nivel + 1, hojas['APR. VIGENTE'], 0.0))[presentes]
+        partes.append(parte
+                      .groupby(['Entidad', 'mes_num', 'nivel', 'padre', 'id', 'codigo'],
+                               observed=True, sort=False)
+                      .agg({**{c: 'sum' for c in datos.SUMAS}, 'propio': 'sum', 'nombre': 'first'})
+                      .reset_index())
+        padre = ruta
+    df = pd.concat(partes, ignore_index=True)
+    df['perc_ejecucion'] = df['OBLIGACION'] / df['APR. VIGENTE']
+    df['perc_compr'] = df['COMPROMISO'] / df['APR. VIGENTE']
+    return df.sort_values(['Entidad', 'mes_num', 'padre', 'codigo'], kind='stable',
+                          ignore_index=True)
+
+
+def construir(dataset=None, salida=None, motor=None):
+    """Calcula el árbol a partir del dataset por rubro y lo escribe en `salida`."""
+    salida = salida or datos.ruta(ARCHIVO)
+    hojas = consultas.agregar(['Entidad', 'mes_num'] + CAMINO + NOMBRES, ruta=dataset,
+                              motor=motor)
+    df = nodos(hojas)
+    tabla = pa.Table.from_pandas(df.astype({'Entidad': 'category'}), preserve_index=False)
+    datos.escribir(tabla, salida)
+
+
+def cargar(ruta=None):
+    return datos.en_cache(ruta or datos.ruta(ARCHIVO), 'arbol',
+                          lambda ruta, version: Arbol(pd.read_parquet(ruta), version))
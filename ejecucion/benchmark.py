@@ -0,0 +1,308 @@
+"""Medición de tiempos del ETL y del tablero con datos sintéticos.
+
+Para cada escala (por defecto 1×, 10× y 100× el tamaño de `datasets/`) se
+arma una carpeta de trabajo `build/benchmark/x<escala>/` con libros mensuales
+sintéticos: cada fila de los informes reales se repite `escala` veces, con las
+mismas columnas, los valores multiplicados por un factor entre 0.5 y 1.5 y,
+desde la segunda copia, el nombre de la unidad ejecutora numerado, para que
+crezcan también las unidades del cubo. El factor depende del rubro y de la
+copia, no del mes, así que los acumulados siguen siendo crecientes. Los libros
+se generan una sola vez y se reutilizan.
+
+Sobre cada carpeta se mide:
+
+- cada etapa del ETL (lectura, transformación, validación, catálogo, escritura,
+  cubo, árbol, proyecciones y pérdidas), con una construcción completa;
+- la primera carga del tablero en un proceso nuevo (fría), una segunda
+  ejecución sin cambios (caliente) y la ejecución que dispara un cambio en
+  cada pestaña, con `streamlit.testing.v1.AppTest`;
+- con `-X importtime`, lo que tarda en importarse cada paquete en la primera
+  carga.
+
+Los resultados se guardan en JSON, junto con el commit y la máquina, para
+comparar entre versiones.
+
+Uso:
+
+    python -m ejecucion.benchmark [--escalas 1 10 100] [--repeticiones N]
+                                  [--salida build/benchmark/resultados.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from . import arbol, calidad, catalogo, cubo, datos, etl, perdidas, proyeccion
+
+log = logging.getLogger(__name__)
+
+CARPETA = os.path.join('build', 'benchmark')
+ESCALAS = [1, 10, 100]
+REPETICIONES = 3
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+CLAVES = ['UEJ', 'RUBRO', 'FUENTE', 'REC', 'SIT']
+ENCABEZADO = 3
+MARCA = '-- tablero --'
+
+
+@contextmanager
+def medir(tiempos, nombre):
+    """Guarda en `tiempos[nombre]` los segundos que tarda el bloque."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tiempos[nombre] = round(time.perf_counter() - inicio, 4)
+
+
+def factores(df, copia):
+    """Factor de escala de cada fila para la `copia`, estable entre meses."""
+    h = pd.util.hash_pandas_object(df[CLAVES].astype('str'), index=False).to_numpy()
+    h = h ^ np.uint64(copia * 0x9E3779B97F4A7C15 % 2**64)
+    return 0.5 + (h % np.uint64(1000)).astype('float64') / 1000
+
+
+def libro_sintetico(origen, destino, escala):
+    """Escribe en `destino` el libro `origen` con cada fila repetida `escala` veces."""
+    from openpyxl import Workbook
+
+    titulo = pd.read_excel(origen, header=None, nrows=ENCABEZADO, engine=etl.motor_excel())
+    df = pd.read_excel(origen, skiprows=ENCABEZADO, engine=etl.motor_excel())
+    df = df.dropna(how='all').iloc[:-1]
+    valores = [c for c in df.columns if pd.api.types.is_float_dtype(df[c])
+               and c in datos.VALORES]
+    copias = [df]
+    for copia in range(1, escala):
+        parte = df.copy()
+        parte[valores] = parte[valores].mul(factores(df, copia), axis=0).round()
+        parte['NOMBRE UEJ'] = parte['NOMBRE UEJ'] + f' {copia}'
+        copias.append(parte)
+    df = pd.concat(copias, ignore_index=True)
+    totales = df[valores].sum()
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Vigencia Actual')
+    for fila in titulo.itertuples(index=False):
+        hoja.append([None if pd.isna(v) else v for v in fila])
+    hoja.append(list(df.columns))
+    for fila in df.astype('object').where(df.notna(), None).itertuples(index=False):
+        hoja.append(fila)
+    hoja.append([totales.get(c) for c in df.columns])
+    datos.reemplazar(destino, libro.save)
+    return len(df)
+
+
+def sintetico(escala, datasets=etl.DATASETS, carpeta=CARPETA):
+    """Carpeta de trabajo con los libros de `datasets` a `escala`, generándolos si faltan."""
+    trabajo = os.path.abspath(os.path.join(carpeta, f'x{escala}'))
+    destino = os.path.join(trabajo, 'datasets')
+    os.makedirs(destino, exist_ok=True)
+    libro_programacion, _ = etl.programacion(datasets)
+    for ruta in etl.libros_mensuales(datasets) + [os.path.join(datasets, libro_programacion)]:
+        salida = os.path.join(destino, os.path.basename(ruta))
+        if os.path.exists(salida):
+            continue
+        if escala == 1 or ruta.endswith(libro_programacion):
+            shutil.copy2(ruta, salida)
+        else:
+            inicio = time.perf_counter()
+            filas = libro_sintetico(ruta, salida, escala)
+            log.info("%s: %d filas sintéticas en %.1f s", salida, filas,
+                     time.perf_counter() - inicio)
+    return trabajo
+
+
+def etapas(trabajo, dictios=etl.DICTIOS, procesos=None):
+    """Tiempo de cada etapa de una construcción completa en `trabajo`."""
+    datasets = os.path.join(trabajo, 'datasets')
+    build = os.path.join(trabajo, 'build')
+    shutil.rmtree(build, ignore_errors=True)
+    libro_programacion, anio = etl.programacion(datasets)
+    ruta_programacion = os.path.join(datasets, libro_programacion)
+    dataset = datos.carpeta(anio, os.path.join(build, datos.DATASET))
+    tiempos = {}
+    with medir(tiempos, 'total'):
+        with medir(tiempos, 'leer'):
+            partes, pies = etl.leer_libros(etl.libros_mensuales(datasets), procesos)
+            df = pd.concat(partes, ignore_index=True)
+        filas = len(df)
+        with medir(tiempos, 'transformar'):
+            dics = etl.leer_diccionarios(dictios)
+            df = etl.transformar(df, dics)
+        with medir(tiempos, 'validar'):
+            calidad.validar(df, pies, dics)
+        with medir(tiempos, 'catalogo'):
+            indice = catalogo.cargar(ruta_programacion, etl.huella(ruta_programacion)['hash'],
+                                     cache=os.path.join(build, 'catalogo.parquet'),
+                                     motor=etl.motor_excel())
+            df = catalogo.asignar(df, indice)
+        with medir(tiempos, 'ratios'):
+            df = etl.ratios(df.drop(columns=etl.DESCARTAR))
+        with medir(tiempos, 'escribir'):
+            etl.escribir(df, dataset)
+        del df
+        with medir(tiempos, 'cubo'):
+            cubo.construir(dataset, os.path.join(build, cubo.ARCHIVO))
+        with medir(tiempos, 'arbol'):
+            arbol.construir(dataset, os.path.join(build, arbol.ARCHIVO))
+        with medir(tiempos, 'proyecciones'):
+            proyeccion.construir(os.path.join(build, cubo.ARCHIVO),
+                                 os.path.join(build, proyeccion.ARCHIVO))
+        with medir(tiempos, 'perdidas'):
+            perdidas.construir(os.path.join(build, proyeccion.ARCHIVO),
+                               os.path.join(build, perdidas.ARCHIVO))
+    return {'filas': filas, 'segundos': tiempos,
+            'bytes': {'dataset': datos.firma(dataset)[1],
+                      **{nombre: os.path.getsize(os.path.join(build, nombre))
+                         for nombre in [cubo.ARCHIVO, arbol.ARCHIVO, proyeccion.ARCHIVO,
+                                        perdidas.ARCHIVO]}}}
+
+
+# Cambio que dispara una ejecución de cada pestaña.
+PESTANAS = {
+    'Vista general': lambda at: at.radio[0].set_value('Sector'),
+    'Navegación detallada': lambda at: at.selectbox[0].select_index(1),
+    'Clasificador de gastos': lambda at: at.selectbox(key='entidad_arbol').select_index(1),
+    'Descarga de datos': lambda at: at.button[0].click(),
+}
+
+
+# Primera carga del tablero en un intérprete que solo importó AppTest, para
+# que `-X importtime` mida todo lo que importa el tablero. Las ejecuciones
+# siguientes las mide `_tablero`, importado después de la segunda marca.
+FRIA = """
+import sys
+import time
+from streamlit.testing.v1 import AppTest
+
+at = AppTest.from_file({app!r}, default_timeout=600)
+print({marca!r}, file=sys.stderr, flush=True)
+inicio = time.perf_counter()
+at.run()
+fria = time.perf_counter() - inicio
+print({marca!r}, file=sys.stderr, flush=True)
+from ejecucion.benchmark import _tablero
+_tablero(at, fria, {repeticiones})
+"""
+
+
+def _tablero(at, fria, repeticiones):
+    """Tiempos del tablero después de la primera carga; se corre en el proceso de `FRIA`."""
+    tiempos = {'fria': round(fria, 4)}
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    calientes = []
+    for _ in range(repeticiones):
+        with medir(tiempos, 'caliente'):
+            at.run()
+        calientes.append(tiempos['caliente'])
+    tiempos['caliente'] = min(calientes)
+    tiempos['pestanas'] = {}
+    for pestana, cambio in PESTANAS.items():
+        with medir(tiempos['pestanas'], pestana):
+            cambio(at).run()
+        if at.exception:
+            raise RuntimeError(f"{pestana}: {at.exception[0].message}")
+    json.dump(tiempos, sys.stdout)
+
+
+def importaciones(salida, n=15):
+    """Perfil de `-X importtime` en `salida`: total y los `n` paquetes más lentos, en ms.
+
+    El tiempo de cada paquete es la suma del tiempo propio de sus módulos.
+    """
+    paquetes = {}
+    for linea in salida.split(MARCA)[1].splitlines():
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, _, modulo = linea[len('import time:'):].split('|')
+        paquete = modulo.strip().split('.')[0]
+        paquetes[paquete] = paquetes.get(paquete, 0) + int(propio) / 1000
+    lentos = sorted(paquetes.items(), key=lambda i: -i[1])[:n]
+    return {'total': round(sum(paquetes.values()), 1),
+            'paquetes': {nombre: round(ms, 1) for nombre, ms in lentos}}
+
+
+def tablero(trabajo, repeticiones=REPETICIONES):
+    """Tiempos del tablero sobre el build de `trabajo`, en un proceso nuevo.
+
+    Incluye el perfil de importaciones de la primera carga.
+    """
+    entorno = {**os.environ,
+               'PYTHONPATH': os.pathsep.join(filter(None, [os.path.dirname(APP),
+                                                           os.environ.get('PYTHONPATH')]))}
+    entorno.pop('EJECUCION_REFRESCO', None)
+    fria = FRIA.format(app=APP, marca=MARCA, repeticiones=repeticiones)
+    resultado = subprocess.run([sys.executable, '-X', 'importtime', '-c', fria],
+                               cwd=trabajo, env=entorno, capture_output=True, text=True,
+                               check=True)
+    tiempos = json.loads(resultado.stdout.strip().splitlines()[-1])
+    tiempos['importaciones'] = importaciones(resultado.stderr)
+    return tiempos
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(APP)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def medir_todo(escalas=ESCALAS, datasets=etl.DATASETS, dictios=etl.DICTIOS, carpeta=CARPETA,
+               repeticiones=REPETICIONES, procesos=None):
+    resultados = {'fecha': datetime.now().isoformat(timespec='seconds'),
+                  'commit': commit(),
+                  'python': platform.python_version(),
+                  'maquina': {'sistema': platform.platform(), 'cpus': os.cpu_count()},
+                  'escalas': {}}
+    dictios = os.path.abspath(dictios)
+    for escala in escalas:
+        trabajo = sintetico(escala, datasets, carpeta)
+        log.info("x%d: ETL", escala)
+        resultado = {'etl': etapas(trabajo, dictios, procesos)}
+        log.info("x%d: tablero", escala)
+        resultado['tablero'] = tablero(trabajo, repeticiones)
+        resultados['escalas'][str(escala)] = resultado
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS)
+    parser.add_argument('--datasets', default=etl.DATASETS)
+    parser.add_argument('--dictios', default=etl.DICTIOS)
+    parser.add_argument('--carpeta', default=CARPETA,
+                        help='carpeta de trabajo para los datos sintéticos')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES,
+                        help='ejecuciones calientes del tablero (se reporta la menor)')
+    parser.add_argument('--procesos', type=int, default=None,
+                        help='procesos para leer los libros (por defecto, uno por CPU)')
+    parser.add_argument('--salida', default=None,
+                        help='archivo JSON de resultados (por defecto, en la carpeta de trabajo)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    resultados = medir_todo(args.escalas, args.datasets, args.dictios, args.carpeta,
+                            args.repeticiones, args.procesos)
+    salida = args.salida or os.path.join(
+        args.carpeta, f"resultados-{resultados['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(salida) or '.', exist_ok=True)
+    with open(salida, 'w') as f:
+        json.dump(resultados, f, indent=4, ensure_ascii=False)
+    print(json.dumps(resultados['escalas'], indent=4, ensure_ascii=False))
+    print(f"Resultados en {salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Validación de los datos de ejecución antes de publicarlos.
+
+El ETL pasa por aquí los meses que acaba de leer, ya con los códigos
+normalizados y los nombres asignados, antes de escribir nada. Cada regla es
+una operación vectorizada sobre todo el DataFrame:
+
+- cada UEJ tiene la forma `NN-NN-NN` (`FORMATO_UEJ`); las que no, como una
+  fila de subtotal, quedan sin códigos de sector, entidad y unidad;
+- cobertura de los diccionarios: los códigos de sector y entidad que no están
+  en `dic_sector.json` o `dic_entidad.json` quedarían sin nombre y
+  desaparecerían de los agrupamientos del tablero. Los de unidad solo se
+  avisan, porque el nombre de la unidad sale de NOMBRE UEJ;
+- COMPROMISO no puede ser menor que OBLIGACION;
+- los valores acumulados (compromisos, obligaciones, órdenes de pago y pagos)
+  no bajan de un mes al siguiente. En un rubro puede pasar (se liberan o se
+  trasladan compromisos), así que se avisa; en el total de la vigencia es un
+  error;
+- la suma de las filas de cada libro coincide con su fila de totales, y cada
+  libro tiene exactamente una.
+
+Las comparaciones toleran el redondeo de la suma en punto flotante. El
+resultado es un informe con una entrada por regla; si alguna de nivel "error"
+falla, `validar` lanza `ErrorCalidad` y la versión no se publica.
+"""
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import datos
+from .datos import VALORES
+
+log = logging.getLogger(__name__)
+
+ERROR = 'error'
+AVISO = 'aviso'
+# Un rubro es la misma fila en todos los libros del año.
+CLAVE = ['Código de unidad', 'Código de rubro', 'FUENTE', 'REC', 'SIT']
+ACUMULADOS = ['COMPROMISO', 'OBLIGACION', 'ORDEN PAGO', 'PAGOS']
+COBERTURA = [('sector', 'Código de sector', ERROR),
+             ('entidad', 'Código de entidad', ERROR),
+             ('unidad', 'Código de unidad', AVISO)]
+TOLERANCIA = 1.0
+TOLERANCIA_RELATIVA = 1e-12
+EJEMPLOS = 3
+FORMATO_UEJ = r'^(\d+)-(\d+)-(\d+)$'
+
+
+class ErrorCalidad(ValueError):
+    """Los datos no pasan la validación; `informe` tiene el detalle."""
+
+    def __init__(self, informe):
+        self.informe = informe
+        super().__init__("los datos no pasan la validación:\n" + resumen(informe))
+
+
+def _menor(a, b):
+    """Dónde `a` es menor que `b` más allá del redondeo."""
+    return a < b - (TOLERANCIA + TOLERANCIA_RELATIVA * np.abs(b))
+
+
+def _regla(regla, nivel, fallas, ejemplos=()):
+    return {'regla': regla, 'nivel': nivel, 'filas': int(fallas),
+            'ejemplos': [str(i) for i in list(ejemplos)[:EJEMPLOS]]}
+
+
+def _rubros(df):
+    return [' / '.join(map(str, fila)) + f" (mes {mes})"
+            for *fila, mes in df[CLAVE + ['mes_num']].head(EJEMPLOS).itertuples(index=False)]
+
+
+def formato(df):
+    # `etl.normalizar_codigos` deja sin código las UEJ que no tienen la forma.
+    falla = df['Código de unidad'].isna()
+    ejemplos = [f"{uej!r} (mes {mes})" for uej, mes in
+                df.loc[falla, ['UEJ', 'mes_num']].drop_duplicates().itertuples(index=False)]
+    return [_regla("UEJ con forma NN-NN-NN", ERROR, falla.sum(), ejemplos)]
+
+
+def cobertura(df, dics):
+    informe = []
+    for nombre, columna, nivel in COBERTURA:
+        # Las filas sin código ya las reporta `formato`.
+        faltan = df[columna].notna() & ~df[columna].isin(dics[nombre].keys())
+        codigos = df.loc[faltan, columna].value_counts().index
+        informe.append(_regla(f"códigos en dic_{nombre}", nivel, faltan.sum(), codigos))
+    return informe
+
+
+def compromisos(df):
+    falla = _menor(df['COMPROMISO'], df['OBLIGACION'])
+    return [_regla("COMPROMISO >= OBLIGACION", ERROR, falla.sum(), _rubros(df[falla]))]
+
+
+def acumulados(df, anteriores=None):
+    """Caídas de los valores acumulados por rubro y en el total de cada mes.
+
+    `anteriores` son los meses ya publicados de la vigencia (ver
+    `publicados`), para comparar también contra ellos. Solo se reportan las
+    caídas hacia los meses de `df`.
+    """
+    columnas = [c for c in CLAVE + ACUMULADOS + ['mes_num'] if c in df.columns]
+    serie = df[columnas]
+    if anteriores is not None and len(anteriores):
+        serie = pd.concat([anteriores[columnas], serie], ignore_index=True)
+    serie = serie.sort_values('mes_num', kind='stable')
+    previo = serie.groupby(CLAVE, dropna=False, observed=True, sort=False)[ACUMULADOS].shift()
+    mensual = serie.groupby('mes_num')[ACUMULADOS].sum()
+    meses = df['mes_num'].unique()
+    nuevos = serie['mes_num'].isin(meses)
+    informe = []
+    for columna in ACUMULADOS:
+        caidas = _menor(serie[columna], previo[columna]) & nuevos
+        informe.append(_regla(f"{columna} acumulado por rubro", AVISO, caidas.sum(),
+                              _rubros(serie[caidas])))
+        caidas = _menor(mensual[columna], mensual[columna].shift()) & mensual.index.isin(meses)
+        informe.append(_regla(f"{columna} acumulado de la vigencia", ERROR, caidas.sum(),
+                              [f"mes {i}" for i in mensual.index[caidas]]))
+    return informe
+
+
+def totales(df, pies):
+    """Suma de las filas de cada mes contra la fila de totales de su libro.
+
+    `pies` son las filas sin UEJ de cada libro, con su `mes_num`.
+    """
+    meses = pd.Index(df['mes_num'].unique())
+    filas = pies['mes_num'].value_counts().reindex(meses, fill_value=0)
+    incompletos = filas[filas != 1]
+    informe = [_regla("una fila de totales por libro", ERROR, len(incompletos),
+                      [f"mes {mes}: {n} filas" for mes, n in incompletos.items()])]
+    columnas = [c for c in VALORES if c in df.columns and c in pies.columns]
+    suma = df.groupby('mes_num')[columnas].sum()
+    pie = pies[pies['mes_num'].isin(filas.index[filas == 1])].set_index('mes_num')[columnas]
+    suma = suma.loc[pie.index]
+    descuadre = _menor(suma, pie) | _menor(pie, suma)
+    fallas = descuadre.stack()
+    fallas = fallas[fallas]
+    informe.append(_regla("suma de las filas = fila de totales", ERROR, len(fallas),
+                          [f"mes {mes}, {columna}: {suma.at[mes, columna]:,.0f} "
+                           f"contra {pie.at[mes, columna]:,.0f}"
+                           for mes, columna in fallas.index]))
+    return informe
+
+
+def revisar(df, pies, dics, anteriores=None):
+    """Informe de todas las reglas sobre `df`."""
+    return (formato(df) + cobertura(df, dics) + compromisos(df) + acumulados(df, anteriores)
+            + totales(df, pies))
+
+
+def resumen(informe):
+    """Texto del informe, una línea por regla."""
+    lineas = []
+    for regla in informe:
+        estado = 'ok' if not regla['filas'] else regla['nivel']
+        linea = f"{estado:<6} {regla['regla']}"
+        if regla['filas']:
+            linea += f": {regla['filas']}"
+            if regla['ejemplos']:
+                linea += f" ({'; '.join(regla['ejemplos'])})"
+        lineas.append(linea)
+    return '\n'.join(lineas)
+
+
+def validar(df, pies, dics, anteriores=None):
+    """Revisa `df`, registra el informe y lanza `ErrorCalidad` si hay errores."""
+    informe = revisar(df, pies, dics, anteriores)
+    log.info("validación de %d filas:\n%s", len(df), resumen(informe))
+    if any(regla['nivel'] == ERROR and regla['filas'] for regla in informe):
+        raise ErrorCalidad(informe)
+    return informe
+
+
+def publicados(salida, meses=()):
+    """Valores acumulados ya escritos en el dataset `salida`, sin los de `meses`."""
+    if not os.path.isdir(salida) or not any(i.startswith('mes_num=') for i in os.listdir(salida)):
+        return None
+    df = datos.leer(salida, CLAVE + ACUMULADOS + ['mes_num'])
+    return df[~df['mes_num'].isin(list(meses))]
@@ -0,0 +1,108 @@
+"""Catálogo de nombres del clasificador de gastos.
+
+La hoja "Programación de gastos" trae una fila por cada cuenta, subcuenta,
+objeto y ordinal, con el nombre solo en la columna de su nivel. Se compila una
+vez en un índice plano con una fila por nodo, llave (Cuenta_n, Subcuenta_n,
+Objeto_n, Ordinal_n) y los nombres de todos sus niveles, y se guarda en la
+carpeta de build (`catalogo.parquet`) junto con el hash del libro del que
+salió.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from . import datos
+
+HOJA = "Programación de gastos"
+ARCHIVO = 'catalogo.parquet'
+
+NIVELES = ['Cuenta_n', 'Subcuenta_n', 'Objeto_n', 'Ordinal_n']
+NOMBRES = ['Cuenta', 'Subcuenta', 'Objeto', 'Ordinal']
+ANCHOS = [2, 2, 2, 3]
+
+
+def codigo(serie, ancho):
+    """Código numérico de `serie` con ceros a la izquierda hasta `ancho` dígitos.
+
+    Equivale a `str(int(x)).zfill(ancho)` fila por fila; lo que no es un
+    entero (celdas vacías, ordinales como '53105C' o '20112E1') queda como NaN.
+    """
+    numero = pd.to_numeric(serie, errors='coerce')
+    if not pd.api.types.is_numeric_dtype(serie):
+        # to_numeric acepta textos como '20112E1' que int() rechaza.
+        entero = serie.astype('str').str.strip().str.fullmatch(r'[+-]?\d+(\.0)?')
+        numero = numero.where(entero.fillna(False).astype(bool))
+    numero = np.trunc(numero)
+    # Int64 evita el '.0'; en pandas 2 sus NA se vuelven el texto '<NA>', así
+    # que se ponen de nuevo como NaN.
+    return numero.astype('Int64').astype('str').str.zfill(ancho).where(numero.notna())
+
+
+def compilar(ruta, motor=None):
+    prog = pd.read_excel(ruta, sheet_name=HOJA, skiprows=6, engine=motor)
+    prog.columns = NIVELES + NOMBRES
+    for nivel, ancho in zip(NIVELES, ANCHOS):
+        prog[nivel] = codigo(prog[nivel], ancho)
+    # Los títulos de sección ('A- PRESUPUESTO DE FUNCIONAMIENTO', 'Cuenta',
+    # 'C'...) no tienen código de cuenta.
+    prog = prog[prog['Cuenta_n'].notna()]
+
+    indice = prog[NIVELES].drop_duplicates().reset_index(drop=True)
+    for i, nombre in enumerate(NOMBRES):
+        llave = NIVELES[:i + 1]
+        # El nombre de cada nivel está en la fila cuyo código más profundo es
+        # el de ese nivel.
+        propias = prog[prog[llave].notna().all(axis=1)
+                       & prog[NIVELES[i + 1:]].isna().all(axis=1)]
+        nombres = (propias[llave + [nombre]]
+                   .dropna()
+                   .drop_duplicates(subset=llave, keep='last'))
+        indice = indice.merge(nombres, on=llave, how='left')
+    return indice
+
+
+def cargar(ruta, version, cache=None, motor=None):
+    """Índice compilado de `ruta`, tomado de `cache` si corresponde a `version`.
+
+    Por defecto `cache` es el `catalogo.parquet` de la versión actual.
+    """
+    cache = cache or datos.ruta(ARCHIVO)
+    if os.path.exists(cache):
+        metadata = pq.read_schema(cache).metadata or {}
+        if metadata.get(b'version') == version.encode():
+            return pd.read_parquet(cache)
+    indice = compilar(ruta, motor)
+    tabla = pa.Table.from_pandas(indice, preserve_index=False)
+    tabla = tabla.replace_schema_metadata({**tabla.schema.metadata,
+                                           b'version': version.encode()})
+    datos.escribir(tabla, cache)
+    return indice
+
+
+def resolver(claves, indice):
+    """Nombres de cada nivel para las `claves`, buscando cada prefijo en el índice."""
+    for i, nombre in enumerate(NOMBRES):
+        llave = NIVELES[:i + 1]
+        nodos = (indice[llave + [nombre]]
+                 .dropna(subset=llave)
+                 .drop_duplicates(subset=llave))
+        claves = claves.merge(nodos, on=llave, how='left')
+    return claves
+
+
+def asignar(df, indice):
+    """Agrega las columnas Cuenta, Subcuenta, Objeto y Ordinal a `df`.
+
+    Los nombres se resuelven una vez por combinación de códigos y se llevan a
+    `df` con un solo merge. Una cuenta que no está en el catálogo (inversión)
+    queda con su código; un ordinal que no está, con el nombre del rubro.
+    """
+    nombres = resolver(df[NIVELES].drop_duplicates(), indice)
+    df = df.drop(columns=NOMBRES, errors='ignore').merge(nombres, on=NIVELES, how='left')
+    df['Cuenta'] = df['Cuenta'].fillna(df['Cuenta_n'])
+    sin_nombre = df['Ordinal'].isna() & df['Ordinal_n'].notna() & df['Objeto'].notna()
+    df.loc[sin_nombre, 'Ordinal'] = df.loc[sin_nombre, 'Nombre de rubro']
+    return df
@@ -0,0 +1,99 @@
+"""Agregaciones sobre el dataset por rubro.
+
+Hay dos motores que dan las mismas cifras:
+
+- pandas: lee a memoria las columnas que pide la consulta (`datos.leer`),
+  filtra y agrupa.
+- duckdb: ejecuta la consulta en SQL directamente sobre los Parquet, sin
+  cargar el dataset; los filtros de mes descartan particiones enteras, los
+  demás se aplican en la lectura, y la agregación corre en varios hilos. Solo
+  vuelve el resultado agregado.
+
+El motor se elige con la variable de entorno `EJECUCION_CONSULTAS` (`pandas`
+por defecto). Si se pide duckdb y no está instalado se usa pandas.
+
+Las sumas de DuckDB se hacen con `fsum`, la suma compensada (Kahan) que usa
+también el groupby de pandas, para que los dos motores coincidan.
+"""
+import logging
+import os
+
+from . import datos
+
+log = logging.getLogger(__name__)
+
+MOTORES = ['pandas', 'duckdb']
+MOTOR = os.environ.get('EJECUCION_CONSULTAS', 'pandas')
+
+
+def elegir_motor(nombre=None):
+    """Motor a usar: `nombre`, o el configurado, si está disponible."""
+    nombre = nombre or MOTOR
+    if nombre not in MOTORES:
+        raise ValueError(f"Motor de consultas desconocido: {nombre!r} (opciones: {MOTORES})")
+    if nombre == 'duckdb':
+        try:
+            import duckdb  # noqa: F401
+        except ImportError:
+            log.warning("duckdb no está instalado; se usa pandas")
+            return 'pandas'
+    return nombre
+
+
+def agregar(dimensiones, filtros=None, medidas=datos.SUMAS, ruta=None, motor=None):
+    """Sumas de `medidas` por `dimensiones` en las filas que cumplen `filtros`.
+
+    `filtros` es un dict {columna: valor o lista de valores}. Los grupos quedan
+    en el orden en que aparecen en el dataset, con las dimensiones de texto
+    como categóricas.
+    """
+    ruta = ruta or datos.carpeta()
+    filtros = {c: list(v) if isinstance(v, (list, tuple, set)) else [v]
+               for c, v in (filtros or {}).items()}
+    if elegir_motor(motor) == 'duckdb':
+        df = _duckdb(dimensiones, filtros, medidas, ruta)
+    else:
+        df = _pandas(dimensiones, filtros, medidas, ruta)
+    # Las categorías son solo los valores presentes, en los dos motores.
+    tipos = {c: 'int8' if c == 'mes_num' else 'category' for c in dimensiones}
+    return df.astype({c: 'object' for c in dimensiones if c != 'mes_num'}).astype(tipos)
+
+
+def _pandas(dimensiones, filtros, medidas, ruta):
+    columnas = list(dict.fromkeys(dimensiones + list(filtros) + medidas))
+    # Sin la caché de `datos.cargar`: el dataset por filas no queda en memoria
+    # después de construir una versión.
+    df = datos.leer(ruta, columnas)
+    for columna, valores in filtros.items():
+        df = df[df[columna].isin(valores)]
+    return (df.groupby(dimensiones, observed=True, sort=False, dropna=False)[medidas].sum()
+            .reset_index())
+
+
+def _nombre(columna):
+    return '"' + columna.replace('"', '""') + '"'
+
+
+def _duckdb(dimensiones, filtros, medidas, ruta):
+    import duckdb
+
+    patron = os.path.join(ruta, '**', '*.parquet').replace("'", "''")
+    condiciones, parametros = [], []
+    for columna, valores in filtros.items():
+        condiciones.append(f"{_nombre(columna)} IN ({', '.join('?' * len(valores))})")
+        parametros.extend(valores)
+    grupos = ', '.join(map(_nombre, dimensiones))
+    sumas = ', '.join(f"fsum({_nombre(c)}) AS {_nombre(c)}" for c in medidas)
+    # Primera aparición de cada grupo en el orden de archivos y filas con que
+    # pyarrow arma el dataset.
+    orden = "min(filename || lpad(CAST(file_row_number AS VARCHAR), 20, '0'))"
+    consulta = f"""
+        SELECT {grupos}, {sumas}
+        FROM read_parquet('{patron}', hive_partitioning = true,
+                          filename = true, file_row_number = true)
+        {'WHERE ' + ' AND '.join(condiciones) if condiciones else ''}
+        GROUP BY {grupos}
+        ORDER BY {orden}
+    """
+    with duckdb.connect() as conexion:
+        return conexion.execute(consulta, parametros).df()
@@ -0,0 +1,65 @@
+"""Cubo de agregados de ejecución.
+
+Sumas de apropiación, compromiso y obligación por sector, entidad, unidad,
+tipo de gasto y mes. Es una tabla pequeña (unas miles de filas) de la que
+salen todas las cifras y gráficos del tablero, sin tocar los datos por rubro.
+Se calcula con el motor de `ejecucion.consultas` que esté configurado.
+"""
+import pyarrow as pa
+
+from . import consultas, datos
+
+ARCHIVO = 'cubo.parquet'
+
+DIMENSIONES = ['Sector', 'Entidad', 'Unidad', 'Tipo de gasto', 'mes_num']
+
+
+class Cubo:
+
+    def __init__(self, df, version):
+        self.df = df
+        self.version = version
+        self.totales = datos.totales_mensuales(df)
+        self.indices = {'Sector': self.agregado('Sector'),
+                        'Entidad': self.agregado('Entidad')}
+
+    def agregado(self, dimension):
+        """Sumas por (`dimension`, mes_num) indexadas por `dimension`.
+
+        Dentro de cada sector o entidad los meses quedan en orden, así que su
+        serie mensual es un slice del agregado.
+        """
+        agregado = (self.df.groupby([dimension, 'mes_num'], observed=True, sort=False)
+                    [datos.SUMAS].sum()
+                    .reset_index(level=dimension)
+                    .sort_index(kind='stable'))
+        return datos.Indice(agregado, dimension)
+
+    def opciones(self, dimension):
+        """Sectores o entidades en el orden en que aparecen en los datos."""
+        return self.indices[dimension].claves
+
+    def mensual(self, dimension, clave):
+        """Sumas mes a mes de un sector o entidad."""
+        return self.indices[dimension][clave][datos.SUMAS]
+
+    def corte(self, dimension, mes):
+        """Sumas de todos los sectores o entidades en un mes."""
+        agregado = self.indices[dimension].df
+        return (agregado.loc[[mes]]
+                .set_index(dimension)
+                .sort_index())
+
+
+def construir(dataset=None, salida=None, motor=None):
+    """Calcula el cubo a partir del dataset por rubro (por defecto, el de la
+    vigencia más reciente) y lo escribe en `salida`."""
+    salida = salida or datos.ruta(ARCHIVO)
+    df = consultas.agregar(DIMENSIONES, ruta=dataset, motor=motor)
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    datos.escribir(tabla, salida)
+
+
+def cargar(ruta=None):
+    return datos.en_cache(ruta or datos.ruta(ARCHIVO), 'cubo',
+                          lambda ruta, version: Cubo(datos.leer(ruta), version))
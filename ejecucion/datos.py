@@ -0,0 +1,348 @@
+"""Acceso a los datos de ejecución.
+
+Los datos se leen del dataset Parquet que produce `ejecucion.etl`, una sola
+vez por proceso, y se guardan en memoria en forma columnar (categóricas para
+los nombres, float64 para los valores). Cada vista pide solo las columnas que
+usa. La entrada en caché se identifica por la ruta y las columnas, y se
+invalida cuando cambia la fecha de modificación o el tamaño de los archivos.
+
+El dataset está particionado por vigencia y mes (`anio=2025/mes_num=8`). La
+vigencia más reciente es la del tablero; las demás se cargan solo cuando una
+vista las pide, a través de `Almacen`, que mantiene en memoria un número
+limitado de ellas.
+
+Todo lo que produce el ETL vive en una carpeta de versión; el puntero
+`build/actual.json` dice cuál está publicada (ver `ejecucion.refresco`). Sin
+puntero, los archivos están directamente en `build/`. Cada ejecución del
+tablero fija la versión al comenzar (`fijar`), así que todas sus lecturas son
+de la misma versión aunque se publique otra mientras tanto.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from . import medicion
+
+log = logging.getLogger(__name__)
+
+BUILD = 'build'
+PUNTERO = 'actual.json'
+DATASET = 'ejecucion'
+PARTICION = ds.partitioning(pa.schema([('mes_num', pa.int8())]), flavor='hive')
+VIGENCIAS_EN_MEMORIA = 4
+
+CATEGORICAS = ['Sector', 'Entidad', 'Unidad', 'Tipo de gasto']
+VALORES = ['APR. INICIAL', 'APR. ADICIONADA', 'APR. REDUCIDA', 'APR. VIGENTE',
+           'APR BLOQUEADA', 'CDP', 'APR. DISPONIBLE', 'COMPROMISO',
+           'OBLIGACION', 'ORDEN PAGO', 'PAGOS']
+SUMAS = ['APR. VIGENTE', 'COMPROMISO', 'OBLIGACION']
+
+_cache = {}
+_lock = threading.Lock()
+_fijada = threading.local()
+_publicada = None
+_aciertos = 0
+_fallos = 0
+
+
+class LRU:
+    """Caché de tamaño fijo que descarta lo usado hace más tiempo.
+
+    Si tiene `nombre`, cuenta sus aciertos y fallos en la traza de `medicion`.
+    """
+
+    def __init__(self, tamano, nombre=None):
+        self.tamano = tamano
+        self.nombre = nombre
+        self.aciertos = 0
+        self.fallos = 0
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, crear):
+        with self._lock:
+            acierto = clave in self._datos
+            if acierto:
+                self.aciertos += 1
+                self._datos.move_to_end(clave)
+                valor = self._datos[clave]
+            else:
+                self.fallos += 1
+        if self.nombre:
+            medicion.contar(self.nombre, acierto)
+        if acierto:
+            return valor
+        valor = crear()
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamano:
+                self._datos.popitem(last=False)
+        return valor
+
+    def descartar(self, condicion):
+        """Saca las entradas cuya clave cumple `condicion`."""
+        with self._lock:
+            for clave in [k for k in self._datos if condicion(k)]:
+                del self._datos[clave]
+
+    def items(self):
+        with self._lock:
+            return list(self._datos.items())
+
+    def estado(self):
+        """Aciertos, fallos y número de entradas."""
+        return {'aciertos': self.aciertos, 'fallos': self.fallos, 'entradas': len(self._datos)}
+
+
+class Indice:
+    """Filas de `df` agrupadas por `columna`, con el rango que ocupa cada valor.
+
+    Las filas se reordenan una sola vez (orden estable, grupos en el orden en
+    que aparecen); después cada grupo es un slice contiguo de `df`, sin copiar
+    ni recorrer la tabla. Con una lista de columnas, las claves son tuplas.
+    """
+
+    def __init__(self, df, columna):
+        if isinstance(columna, list):
+            codigos, claves = pd.MultiIndex.from_frame(df[columna]).factorize()
+        else:
+            codigos, claves = pd.factorize(df[columna], sort=False)
+        orden = np.argsort(codigos, kind='stable')
+        # Las filas sin valor (código -1) quedan al principio, fuera de todo rango.
+        limites = np.searchsorted(codigos[orden], np.arange(len(claves) + 1))
+        self.df = df.iloc[orden]
+        self.claves = list(claves)
+        self.rangos = {clave: (limites[i], limites[i + 1])
+                       for i, clave in enumerate(self.claves)}
+
+    def __getitem__(self, clave):
+        inicio, fin = self.rangos[clave]
+        return self.df.iloc[inicio:fin]
+
+    def __contains__(self, clave):
+        return clave in self.rangos
+
+
+class Datos:
+
+    def __init__(self, df, version):
+        self.df = df
+        self.version = version
+        self.totales = totales_mensuales(df)
+
+    def memoria(self):
+        """Bytes que ocupa la tabla en memoria."""
+        return int(self.df.memory_usage(deep=True).sum())
+
+
+class Almacen:
+    """Vigencias de `raiz`, cargadas en memoria solo cuando se piden.
+
+    Cada (vigencia, columnas) cargada es una entrada de un LRU de `tamano`
+    entradas; al pasarse del límite se libera la usada hace más tiempo.
+    """
+
+    def __init__(self, raiz=None, tamano=VIGENCIAS_EN_MEMORIA):
+        self.raiz = raiz
+        self.cargadas = LRU(tamano, 'vigencias')
+
+    def vigencias(self):
+        return vigencias(self.raiz)
+
+    def cargar(self, anio, columnas=None):
+        ruta = carpeta(anio, self.raiz)
+        columnas = tuple(columnas) if columnas else None
+        version = firma(ruta)
+
+        def crear():
+            # Una versión anterior de la misma vigencia ya no sirve.
+            self.cargadas.descartar(lambda k: k[:2] == (anio, columnas) and k[2] != version)
+            datos = Datos(leer(ruta, list(columnas) if columnas else None), version)
+            log.info("vigencia %d cargada: %d filas, %.1f MB",
+                     anio, len(datos.df), datos.memoria() / 2**20)
+            return datos
+
+        return self.cargadas.obtener((anio, columnas, version), crear)
+
+    def memoria(self):
+        """Bytes en memoria por vigencia cargada."""
+        uso = {}
+        for (anio, _, _), datos in self.cargadas.items():
+            uso[anio] = uso.get(anio, 0) + datos.memoria()
+        return uso
+
+    def totales(self, vigencias=None):
+        """Totales mensuales de cada vigencia, en un DataFrame con índice (anio, mes_num)."""
+        vigencias = vigencias or self.vigencias()
+        return pd.concat({i: self.cargar(i, ['mes_num'] + SUMAS).totales for i in vigencias},
+                         names=['anio'])
+
+
+almacen = Almacen()
+medicion.registrar('vigencias', almacen.cargadas.estado)
+
+
+def publicada(build=BUILD):
+    """Carpeta de la versión publicada en `build` (o `build` si no hay puntero)."""
+    try:
+        with open(os.path.join(build, PUNTERO), 'r') as f:
+            return os.path.join(build, json.load(f)['version'])
+    except FileNotFoundError:
+        return build
+
+
+def fijar(build=BUILD):
+    """Fija para el hilo actual la versión publicada en este momento.
+
+    Si cambió la versión publicada, se liberan los datos en caché de las
+    anteriores.
+    """
+    global _publicada
+    base = _fijada.base = publicada(build)
+    if base != _publicada:
+        prefijo = os.path.join(os.path.abspath(base), '')
+        with _lock:
+            for vieja in [k for k in _cache if not k[0].startswith(prefijo)]:
+                del _cache[vieja]
+        _publicada = base
+    return base
+
+
+def base():
+    """Carpeta de la versión fijada por el hilo actual, o la publicada."""
+    return getattr(_fijada, 'base', None) or publicada()
+
+
+def ruta(nombre):
+    """Ruta de `nombre` dentro de la versión actual."""
+    return os.path.join(base(), nombre)
+
+
+def vigencias(raiz=None):
+    """Años con datos en `raiz`, de menor a mayor."""
+    raiz = raiz or ruta(DATASET)
+    if not os.path.isdir(raiz):
+        return []
+    return sorted(int(m.group(1)) for m in map(re.compile(r'anio=(\d{4})$').match,
+                                               os.listdir(raiz)) if m)
+
+
+def carpeta(anio=None, raiz=None):
+    """Carpeta de la vigencia `anio`, por defecto la más reciente."""
+    raiz = raiz or ruta(DATASET)
+    if anio is None:
+        anio = max(vigencias(raiz), default=None)
+        if anio is None:
+            raise FileNotFoundError(f"No hay vigencias en {raiz}; ejecute `python -m ejecucion.etl`.")
+    return os.path.join(raiz, f'anio={anio}')
+
+
+def firma(ruta):
+    """Fecha de modificación más reciente y tamaño total de `ruta`."""
+    if os.path.isfile(ruta):
+        stat = os.stat(ruta)
+        return (stat.st_mtime_ns, stat.st_size)
+    mtime, tamano = 0, 0
+    for carpeta, _, archivos in os.walk(ruta):
+        for archivo in archivos:
+            stat = os.stat(os.path.join(carpeta, archivo))
+            mtime = max(mtime, stat.st_mtime_ns)
+            tamano += stat.st_size
+    return (mtime, tamano)
+
+
+def reemplazar(ruta, escribir):
+    """Escribe `ruta` con `escribir(temporal)` y la reemplaza de una vez.
+
+    El temporal es propio (`tempfile.mkstemp`, en la misma carpeta), así que
+    dos procesos que escriben el mismo archivo no se pisan, y quien lee ve el
+    archivo anterior o el nuevo completo.
+    """
+    carpeta = os.path.dirname(ruta) or '.'
+    os.makedirs(carpeta, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+    os.close(descriptor)
+    try:
+        escribir(temporal)
+        # mkstemp crea el archivo solo legible por el dueño.
+        os.chmod(temporal, 0o644)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def escribir(tabla, ruta):
+    """Escribe la tabla de pyarrow `tabla` en el Parquet `ruta` (ver `reemplazar`)."""
+    reemplazar(ruta, lambda temporal: pq.write_table(tabla, temporal))
+
+
+def leer(ruta, columnas=None):
+    tabla = pq.read_table(ruta,
+                          columns=columnas,
+                          memory_map=True,
+                          partitioning=PARTICION if os.path.isdir(ruta) else None)
+    df = tabla.to_pandas()
+    tipos = {c: 'category' for c in CATEGORICAS if c in df.columns}
+    tipos.update({c: 'float64' for c in VALORES if c in df.columns})
+    return df.astype(tipos)
+
+
+def totales_mensuales(df):
+    if not set(SUMAS + ['mes_num']).issubset(df.columns):
+        return None
+    totales = df.groupby('mes_num')[SUMAS].sum()
+    totales['perc_ejecucion'] = totales['OBLIGACION'] / totales['APR. VIGENTE']
+    totales['perc_compr'] = totales['COMPROMISO'] / totales['APR. VIGENTE']
+    return totales
+
+
+def en_cache(ruta, clave, crear):
+    """Objeto guardado para (`ruta`, `clave`), o `crear(version)` si cambió `ruta`.
+
+    El objeto creado debe tener un atributo `version`.
+    """
+    global _aciertos, _fallos
+    ruta = os.path.abspath(ruta)
+    version = firma(ruta)
+    with _lock:
+        obj = _cache.get((ruta, clave))
+        acierto = obj is not None and obj.version == version
+        medicion.contar('archivos', acierto)
+        if acierto:
+            _aciertos += 1
+        else:
+            _fallos += 1
+            # Se descartan todas las entradas de la versión anterior.
+            for vieja in [k for k, v in _cache.items()
+                          if k[0] == ruta and v.version != version]:
+                del _cache[vieja]
+            obj = crear(ruta, version)
+            _cache[(ruta, clave)] = obj
+    return obj
+
+
+def estado_cache():
+    """Aciertos, fallos y número de entradas de `en_cache`."""
+    return {'aciertos': _aciertos, 'fallos': _fallos, 'entradas': len(_cache)}
+
+
+medicion.registrar('archivos', estado_cache)
+
+
+def cargar(ruta=None, columnas=None):
+    """Devuelve las `columnas` de `ruta` (la vigencia más reciente si no se da),
+    leyéndolas solo si cambió el dataset."""
+    return en_cache(ruta or carpeta(), tuple(columnas) if columnas else None,
+                    lambda ruta, version: Datos(leer(ruta, columnas), version))
@@ -0,0 +1,410 @@
+"""Construcción del dataset de ejecución a partir de los informes mensuales.
+
+Es el mismo proceso que se hacía en exper.ipynb: se leen los `datasets/*.xlsx`
+de cada mes, se asignan sector, entidad y unidad con los diccionarios de
+`dictios/`, se normalizan los códigos del rubro y se les pone nombre con la
+hoja "Programación de gastos" de `programacion_<año>.xlsx`. El resultado se
+escribe como un dataset Parquet particionado por vigencia y mes
+(`build/ejecucion/anio=2025/mes_num=8/`), con las columnas de texto
+codificadas como diccionario. Si la vigencia procesada es la más reciente, se
+recalculan el cubo de agregados (`ejecucion.cubo`), el árbol del clasificador
+(`ejecucion.arbol`), las proyecciones a diciembre (`ejecucion.proyeccion`) y
+el ranking de pérdida de apropiación (`ejecucion.perdidas`), y se arma la
+instantánea de la vista general (`ejecucion.instantanea`). Las vigencias
+anteriores que haya en la salida se usan para el modelo estacional de las
+proyecciones.
+
+La carga es incremental: el manifiesto `_manifiesto.json` de cada vigencia guarda
+el tamaño y el hash de cada libro ya procesado, y solo se leen los meses
+nuevos o modificados. Si cambian la programación o los diccionarios se
+reconstruye todo.
+
+Antes de escribir, los meses leídos pasan por la validación de
+`ejecucion.calidad` (cobertura de los diccionarios, compromisos contra
+obligaciones, acumulados y fila de totales de cada libro). Si falla, el ETL se
+detiene y la versión no se publica; el informe de la última carga queda en el
+manifiesto.
+
+Los libros se leen en paralelo en un pool de procesos (`--procesos`). Si está
+instalado `python-calamine` se usa como lector de XLSX, que es bastante más
+rápido que openpyxl.
+
+Cada corrida se publica como una versión nueva (ver `ejecucion.refresco`).
+
+Uso:
+
+    python -m ejecucion.etl [--completo] [--procesos N] [--motor openpyxl]
+                            [--corte MES] [--historia build/ejecucion/anio=2023 ...]
+
+Para cargar otra vigencia se apunta `--datasets` a la carpeta con sus libros y
+su `programacion_<año>.xlsx`.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from . import arbol, calidad, catalogo, consultas, cubo, instantanea, perdidas, proyeccion
+from .catalogo import codigo
+from . import datos
+from .datos import VALORES
+
+log = logging.getLogger(__name__)
+
+DATASETS = 'datasets'
+DICTIOS = 'dictios'
+PROGRAMACION = re.compile(r'programacion_(\d{4})\.xlsx$')
+MANIFIESTO = '_manifiesto.json'
+DICCIONARIOS = ['dic_entidad.json', 'dic_sector.json', 'dic_unidad.json']
+
+MESES = {'enero': 1,
+         'febrero': 2,
+         'marzo': 3,
+         'abril': 4,
+         'mayo': 5,
+         'junio': 6,
+         'julio': 7,
+         'agosto': 8,
+         'septiembre': 9,
+         'octubre': 10,
+         'noviembre': 11,
+         'diciembre': 12}
+
+TIPO_GASTO = {'A': 'Funcionamiento',
+              'B': 'Deuda',
+              'C': 'Inversión'}
+
+DESCARTAR = ['RUBRO', 'DESCRIPCION', 'UEJ', 'NOMBRE UEJ', 'SOR\nORD', 'ITEM',
+             'SUB\nITEM', 'SUB\nITEM 2']
+
+
+def libros_mensuales(carpeta=DATASETS):
+    """Rutas de los informes mensuales de `carpeta`, en orden de mes."""
+    libros = [i for i in os.listdir(carpeta)
+              if i.endswith('.xlsx') and i.split('.')[0] in MESES]
+    libros.sort(key=lambda i: MESES[i.split('.')[0]])
+    return [os.path.join(carpeta, i) for i in libros]
+
+
+def programacion(carpeta=DATASETS):
+    """Nombre del libro de programación de `carpeta` y la vigencia a la que corresponde."""
+    libros = [m for m in map(PROGRAMACION.match, os.listdir(carpeta)) if m]
+    if len(libros) != 1:
+        raise FileNotFoundError(f"Se esperaba un programacion_<año>.xlsx en {carpeta}, "
+                                f"hay {len(libros)}.")
+    return libros[0].group(0), int(libros[0].group(1))
+
+
+def motor_excel():
+    """Lector de XLSX a usar: calamine si está instalado, si no openpyxl."""
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return 'openpyxl'
+    return 'calamine'
+
+
+def leer_mes(ruta, motor=None):
+    """Filas del libro `ruta` y, aparte, su pie: las filas sin UEJ.
+
+    El pie debería ser solo la fila de totales; lo revisa `calidad.totales`.
+    """
+    df = pd.read_excel(ruta, skiprows=3, engine=motor or motor_excel())
+    # calamine deja las filas vacías del final.
+    df = df.dropna(how='all')
+    df = df.astype({c: 'float64' for c in VALORES if c in df.columns})
+    df['mes'] = os.path.basename(ruta).split('.')[0]
+    pie = df['UEJ'].isna()
+    return df[~pie], df[pie]
+
+
+def _leer_mes_medido(ruta, motor):
+    inicio = time.perf_counter()
+    df, pie = leer_mes(ruta, motor)
+    return df, pie, time.perf_counter() - inicio
+
+
+def leer_libros(libros, procesos=None, motor=None):
+    """Lee los `libros` en un pool de `procesos` y reporta el tiempo de cada uno.
+
+    Devuelve las filas de cada libro y los pies de todos juntos.
+    """
+    motor = motor or motor_excel()
+    procesos = min(procesos or os.cpu_count() or 1, len(libros))
+    inicio = time.perf_counter()
+    if procesos <= 1:
+        resultados = [_leer_mes_medido(i, motor) for i in libros]
+    else:
+        # Con spawn, no fork: el ETL también corre en un hilo del tablero
+        # (`refresco`), y un fork con otros hilos vivos puede copiar locks tomados.
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            resultados = list(pool.map(_leer_mes_medido, libros, repeat(motor)))
+    for ruta, (df, _, segundos) in zip(libros, resultados):
+        log.info("%s: %d filas en %.2f s", os.path.basename(ruta), len(df), segundos)
+    log.info("%d libros leídos con %s y %d procesos en %.2f s",
+             len(libros), motor, procesos, time.perf_counter() - inicio)
+    pies = pd.concat([pie for _, pie, _ in resultados], ignore_index=True)
+    pies['mes_num'] = pies['mes'].map(MESES)
+    return [df for df, _, _ in resultados], pies
+
+
+def leer_diccionarios(carpeta=DICTIOS):
+    dics = {}
+    for nombre in ['entidad', 'sector', 'unidad']:
+        with open(os.path.join(carpeta, f'dic_{nombre}.json'), 'r') as f:
+            dics[nombre] = json.load(f)
+    return dics
+
+
+def normalizar_codigos(df):
+    # Las UEJ sin la forma NN-NN-NN quedan sin código; las reporta
+    # `calidad.formato`.
+    partes = df['UEJ'].str.extract(calidad.FORMATO_UEJ).dropna()
+    df['Código de entidad'] = (partes[0] + partes[1]).astype(int).astype(str)
+    df['Código de sector'] = partes[0].astype(int).astype(str)
+    df['Código de unidad'] = (partes[0] + partes[1] + partes[2]).astype(int).astype(str)
+
+    df['Cuenta_n'] = codigo(df['CTA'], 2)
+    df['Subcuenta_n'] = codigo(df['SUB\nCTA'], 2)
+    df['Objeto_n'] = codigo(df['OBJ'], 2)
+    df['Ordinal_n'] = codigo(df['ORD'], 3)
+    return df
+
+
+def transformar(df, dics):
+    df = normalizar_codigos(df)
+
+    df['Sector'] = df['Código de sector'].map(dics['sector'])
+    df['Entidad'] = df['Código de entidad'].map(dics['entidad'])
+    df['Unidad'] = df['NOMBRE UEJ'].str.capitalize()
+
+    df['Tipo de gasto'] = df['TIPO'].map(TIPO_GASTO)
+    df['Código de rubro'] = df['RUBRO']
+    df['Nombre de rubro'] = df['DESCRIPCION']
+    df['mes_num'] = df['mes'].map(MESES)
+    return df
+
+
+def ratios(df):
+    # Participación de cada rubro en la apropiación total de su mes.
+    apropiacion_mes = df.groupby('mes_num')['APR. VIGENTE'].transform('sum')
+    df['perc_ejecucion'] = df['OBLIGACION'] / apropiacion_mes
+    df['perc_compr'] = df['COMPROMISO'] / apropiacion_mes
+    df['perc_perdida'] = 1 - df['perc_compr']
+    return df
+
+
+def huella(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return {'tamano': os.path.getsize(ruta), 'hash': h.hexdigest()}
+
+
+def leer_manifiesto(salida):
+    ruta = os.path.join(salida, MANIFIESTO)
+    if not os.path.exists(ruta):
+        return {'referencias': {}, 'libros': {}}
+    with open(ruta, 'r') as f:
+        return json.load(f)
+
+
+def guardar_manifiesto(manifiesto, salida):
+    def escribir_json(temporal):
+        with open(temporal, 'w') as f:
+            json.dump(manifiesto, f, indent=4, ensure_ascii=False)
+
+    datos.reemplazar(os.path.join(salida, MANIFIESTO), escribir_json)
+
+
+def a_tabla(df):
+    texto = df.select_dtypes(include=['object', 'string']).columns
+    df = df.astype({c: 'category' for c in texto})
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    # Mismo tipo en todas las particiones, aunque un mes traiga una columna
+    # de texto vacía.
+    esquema = pa.schema([pa.field(f.name, pa.dictionary(pa.int32(), pa.string()))
+                         if pa.types.is_dictionary(f.type) else f
+                         for f in tabla.schema], metadata=tabla.schema.metadata)
+    return tabla.cast(esquema)
+
+
+def escribir(df, salida):
+    """Escribe (o reemplaza) las particiones de los meses presentes en `df`."""
+    pq.write_to_dataset(a_tabla(df), salida,
+                        partition_cols=['mes_num'],
+                        basename_template='parte-{i}.parquet',
+                        existing_data_behavior='delete_matching',
+                        use_dictionary=True)
+
+
+def procesar(libros, dics, indice, procesos=None, motor=None, anteriores=None):
+    """Dataset de los `libros` y el informe de su validación.
+
+    `anteriores` son los valores ya publicados de la vigencia (ver
+    `calidad.publicados`). Si los datos no pasan la validación se lanza
+    `calidad.ErrorCalidad` antes de escribir nada.
+    """
+    partes, pies = leer_libros(libros, procesos, motor)
+    df = transformar(pd.concat(partes, ignore_index=True), dics)
+    informe = calidad.validar(df, pies, dics, anteriores)
+    df = catalogo.asignar(df, indice)
+    df = df.drop(columns=DESCARTAR)
+    return ratios(df), informe
+
+
+def actualizar(datasets=DATASETS, dictios=DICTIOS, destino=datos.BUILD, completo=False,
+               procesos=None, motor=None, corte=None, historia=None, anio=None):
+    """Procesa los libros nuevos o modificados y devuelve sus rutas.
+
+    Todo se escribe en `destino`: el dataset en `destino/ejecucion` y los
+    agregados al lado. La vigencia es la del libro de programación de
+    `datasets`, salvo que se indique `anio`. `corte` y `historia` son el mes de
+    corte y los datasets de otros años para las proyecciones (ver
+    `proyeccion.construir`); por defecto la historia son las vigencias
+    anteriores del dataset.
+    """
+    libro_programacion, anio_programacion = programacion(datasets)
+    anio = anio or anio_programacion
+    raiz = os.path.join(destino, datos.DATASET)
+    salida = datos.carpeta(anio, raiz)
+    salida_cubo = os.path.join(destino, cubo.ARCHIVO)
+    salida_arbol = os.path.join(destino, arbol.ARCHIVO)
+    salida_proyecciones = os.path.join(destino, proyeccion.ARCHIVO)
+    salida_perdidas = os.path.join(destino, perdidas.ARCHIVO)
+
+    manifiesto = leer_manifiesto(salida)
+    original = json.loads(json.dumps(manifiesto))
+    referencias = {libro_programacion: huella(os.path.join(datasets, libro_programacion))}
+    referencias.update({i: huella(os.path.join(dictios, i)) for i in DICCIONARIOS})
+    if completo or manifiesto['referencias'] != referencias:
+        if os.path.exists(salida):
+            shutil.rmtree(salida)
+        manifiesto = {'referencias': referencias, 'libros': {}}
+
+    libros = {os.path.basename(i): i for i in libros_mensuales(datasets)}
+    huellas = {nombre: huella(ruta) for nombre, ruta in libros.items()}
+    pendientes = [nombre for nombre in libros
+                  if {k: manifiesto['libros'].get(nombre, {}).get(k)
+                      for k in ('tamano', 'hash')} != huellas[nombre]]
+
+    # Los meses cuyo libro ya no está se sacan del dataset.
+    retirados = set(manifiesto['libros']) - set(libros)
+    for nombre in retirados:
+        mes_num = manifiesto['libros'].pop(nombre)['mes_num']
+        shutil.rmtree(os.path.join(salida, f'mes_num={mes_num}'), ignore_errors=True)
+
+    if pendientes:
+        dics = leer_diccionarios(dictios)
+        indice = catalogo.cargar(os.path.join(datasets, libro_programacion),
+                                 referencias[libro_programacion]['hash'],
+                                 cache=os.path.join(destino, catalogo.ARCHIVO),
+                                 motor=motor or motor_excel())
+        meses = [MESES[i.split('.')[0]] for i in pendientes]
+        df, informe = procesar([libros[i] for i in pendientes], dics, indice, procesos, motor,
+                               calidad.publicados(salida, meses))
+        escribir(df, salida)
+        manifiesto['calidad'] = informe
+        for nombre in pendientes:
+            mes_num = MESES[nombre.split('.')[0]]
+            manifiesto['libros'][nombre] = {**huellas[nombre],
+                                            'mes_num': mes_num,
+                                            'filas': int((df['mes_num'] == mes_num).sum())}
+
+    os.makedirs(salida, exist_ok=True)
+    # Sin cambios no se toca nada, así la firma de `destino` sigue igual.
+    if manifiesto != original:
+        guardar_manifiesto(manifiesto, salida)
+
+    # El cubo y las proyecciones son de la vigencia más reciente; si cambia
+    # una anterior, cambia la historia del modelo estacional.
+    vigencias = datos.vigencias(raiz)
+    ultima = datos.carpeta(vigencias[-1], raiz)
+    cambios = bool(pendientes or retirados)
+    nuevo_cubo = (cambios and anio == vigencias[-1]) or not os.path.exists(salida_cubo)
+    if nuevo_cubo:
+        cubo.construir(ultima, salida_cubo)
+    if nuevo_cubo or not os.path.exists(salida_arbol):
+        arbol.construir(ultima, salida_arbol)
+    if (cambios or nuevo_cubo or corte or historia is not None
+            or not os.path.exists(salida_proyecciones)):
+        if historia is None:
+            historia = [datos.carpeta(i, raiz) for i in vigencias[:-1]]
+        proyeccion.construir(salida_cubo, salida_proyecciones, corte, historia)
+        perdidas.construir(salida_proyecciones, salida_perdidas)
+    elif not os.path.exists(salida_perdidas):
+        perdidas.construir(salida_proyecciones, salida_perdidas)
+    if not instantanea.al_dia(destino):
+        # Sin instantánea el tablero calcula la vista general; no es motivo
+        # para no publicar los datos.
+        try:
+            instantanea.construir(destino)
+        except Exception:
+            log.exception("no se pudo armar la instantánea de la vista general")
+    return [libros[i] for i in pendientes]
+
+
+def main():
+    from . import refresco
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--datasets', default=DATASETS)
+    parser.add_argument('--dictios', default=DICTIOS)
+    parser.add_argument('--build', default=datos.BUILD,
+                        help='carpeta donde se publican las versiones de los datos')
+    parser.add_argument('--completo', action='store_true',
+                        help='reconstruye todos los meses aunque no hayan cambiado')
+    parser.add_argument('--procesos', type=int, default=None,
+                        help='procesos para leer los libros (por defecto, uno por CPU)')
+    parser.add_argument('--motor', choices=['openpyxl', 'calamine'], default=None,
+                        help='lector de XLSX (por defecto calamine si está instalado)')
+    parser.add_argument('--corte', type=int, choices=range(1, 13), default=None,
+                        help='mes de corte de las proyecciones (por defecto, el último con datos)')
+    parser.add_argument('--historia', nargs='*', default=None,
+                        help='datasets de vigencias anteriores para el modelo estacional '
+                             '(por defecto, las vigencias anteriores del dataset)')
+    parser.add_argument('--consultas', choices=consultas.MOTORES, default=None,
+                        help='motor para calcular el cubo (por defecto, EJECUCION_CONSULTAS o pandas)')
+    parser.add_argument('--anio', type=int, default=None,
+                        help='vigencia de los libros (por defecto, la del libro de programación)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.corte:
+        meses = [MESES[os.path.basename(i).split('.')[0]] for i in libros_mensuales(args.datasets)]
+        if not meses or args.corte > max(meses):
+            parser.error(f"--corte {args.corte}: el último mes con datos en {args.datasets} es "
+                         f"{max(meses, default='ninguno')}")
+    if args.consultas:
+        consultas.MOTOR = args.consultas
+    try:
+        version, procesados = refresco.publicar(args.datasets, args.dictios, args.build,
+                                                completo=args.completo, procesos=args.procesos,
+                                                motor=args.motor, corte=args.corte,
+                                                historia=args.historia, anio=args.anio)
+    except calidad.ErrorCalidad:
+        # El informe ya quedó en el log.
+        sys.exit("Los datos no pasan la validación; no se publicó una versión nueva.")
+    if procesados:
+        print(f"Meses procesados: {', '.join(os.path.basename(i) for i in procesados)}")
+    else:
+        print("No hay libros nuevos ni modificados.")
+    if version:
+        print(f"Versión publicada: {version}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Exportación filtrada del dataset de ejecución.
+
+El archivo se arma solo cuando se pide, leyendo el dataset Parquet por lotes
+con los filtros aplicados en la lectura (solo se abren las particiones de los
+meses pedidos), y cada lote se escribe al archivo de salida antes de leer el
+siguiente: la memoria usada depende del tamaño del lote, no del número de
+meses. El resultado queda en disco con un nombre que depende de la versión de
+los datos, los filtros y el formato, así que la misma descarga no se vuelve a
+generar mientras los datos no cambien.
+
+Cada archivo se escribe en un temporal propio y se mueve a su nombre final al
+terminar, así que varias sesiones pueden pedir la misma descarga a la vez.
+Las carpetas de versiones anteriores se borran cuando llevan `VIGENCIA`
+segundos sin cambios, para no quitarle los archivos a una sesión que todavía
+los esté generando o descargando.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from . import datos
+
+CARPETA = os.path.join(datos.BUILD, 'exportaciones')
+FORMATOS = {'CSV.gz': ('csv.gz', 'application/gzip'),
+            'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+            'XLSX': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')}
+LOTE = 64 * 1024
+FILAS_XLSX = 1_048_575
+VIGENCIA = 3600
+
+
+def columnas(ruta=None):
+    return ds.dataset(ruta or datos.carpeta(), format='parquet', partitioning=datos.PARTICION).schema.names
+
+
+def filtro(sectores=None, entidades=None, meses=None):
+    """Expresión de pyarrow para los sectores, entidades y rango de meses dados."""
+    condiciones = []
+    if sectores:
+        condiciones.append(ds.field('Sector').isin(list(sectores)))
+    if entidades:
+        condiciones.append(ds.field('Entidad').isin(list(entidades)))
+    if meses:
+        desde, hasta = meses
+        condiciones.append((ds.field('mes_num') >= desde) & (ds.field('mes_num') <= hasta))
+    expresion = None
+    for condicion in condiciones:
+        expresion = condicion if expresion is None else expresion & condicion
+    return expresion
+
+
+def lector(ruta=None, columnas=None, sectores=None, entidades=None, meses=None):
+    """Scanner del dataset con los filtros aplicados en la lectura."""
+    dataset = ds.dataset(ruta or datos.carpeta(), format='parquet', partitioning=datos.PARTICION)
+    return dataset.scanner(columns=columnas,
+                           filter=filtro(sectores, entidades, meses),
+                           batch_size=LOTE)
+
+
+def _texto(esquema):
+    # Los escritores de CSV y XLSX no entienden columnas diccionario.
+    return pa.schema([pa.field(f.name, pa.string()) if pa.types.is_dictionary(f.type) else f
+                      for f in esquema])
+
+
+def _csv_gz(scanner, destino):
+    import pyarrow.csv as csv
+
+    esquema = _texto(scanner.projected_schema)
+    with gzip.open(destino, 'wb') as f, csv.CSVWriter(f, esquema) as escritor:
+        for lote in scanner.to_batches():
+            escritor.write_batch(lote.cast(esquema))
+
+
+def _parquet(scanner, destino):
+    with pq.ParquetWriter(destino, scanner.projected_schema) as escritor:
+        for lote in scanner.to_batches():
+            escritor.write_batch(lote)
+
+
+def _xlsx(scanner, destino):
+    from openpyxl import Workbook
+
+    esquema = _texto(scanner.projected_schema)
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Ejecución')
+    hoja.append(esquema.names)
+    filas = 0
+    for lote in scanner.to_batches():
+        lote = lote.cast(esquema)
+        filas += lote.num_rows
+        if filas > FILAS_XLSX:
+            raise ValueError(f"La selección tiene más de {FILAS_XLSX} filas; "
+                             "use CSV.gz o Parquet.")
+        for fila in zip(*(c.to_pylist() for c in lote.columns)):
+            hoja.append(fila)
+    libro.save(destino)
+
+
+ESCRITORES = {'CSV.gz': _csv_gz, 'Parquet': _parquet, 'XLSX': _xlsx}
+
+
+def nombre(version, formato, **filtros):
+    """Nombre del archivo para `version`, `formato` y `filtros`."""
+    clave = json.dumps([version, formato, filtros], sort_keys=True, default=list)
+    return (f"ejecucion-{hashlib.sha1(clave.encode()).hexdigest()[:16]}"
+            f".{FORMATOS[formato][0]}")
+
+
+def exportar(formato, ruta=None, carpeta=CARPETA, columnas=None, sectores=None,
+             entidades=None, meses=None):
+    """Ruta del archivo exportado, generándolo si no existe para esta versión.
+
+    Los archivos de versiones anteriores de los datos se borran (ver `limpiar`).
+    """
+    ruta = ruta or datos.carpeta()
+    version = list(datos.firma(ruta))
+    filtros = dict(columnas=columnas, sectores=sorted(sectores or []),
+                   entidades=sorted(entidades or []), meses=meses)
+    subcarpeta = os.path.join(carpeta, '-'.join(map(str, version)))
+    destino = os.path.join(subcarpeta, nombre(version, formato, **filtros))
+    if os.path.exists(destino):
+        return destino
+
+    limpiar(carpeta, subcarpeta)
+    datos.reemplazar(destino, lambda temporal: ESCRITORES[formato](
+        lector(ruta, columnas, sectores, entidades, meses), temporal))
+    return destino
+
+
+def limpiar(carpeta=CARPETA, actual=None, vigencia=VIGENCIA):
+    """Borra las subcarpetas de `carpeta`, salvo `actual`, sin cambios hace `vigencia` segundos."""
+    if not os.path.isdir(carpeta):
+        return
+    limite = time.time() - vigencia
+    for nombre_carpeta in os.listdir(carpeta):
+        vieja = os.path.join(carpeta, nombre_carpeta)
+        try:
+            if vieja != actual and os.path.getmtime(vieja) < limite:
+                shutil.rmtree(vieja, ignore_errors=True)
+        except OSError:
+            # Otra sesión la borró primero.
+            pass
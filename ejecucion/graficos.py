@@ -0,0 +1,301 @@
+"""Gráficos del tablero.
+
+Todas las figuras salen de aquí y se guardan en una caché LRU por
+(alcance, clave, mes de corte, versión de los datos): mientras los datos no
+cambien, volver a un sector o entidad ya visto no reconstruye la figura.
+
+Las series mensuales y su pronóstico vienen de la tabla de proyecciones
+(`ejecucion.proyeccion`); los rankings, del cubo.
+
+Plotly se importa en cada función que arma una figura, no al importar el
+módulo: quien solo usa las cifras (o encuentra la figura en la caché) no paga
+esa importación.
+"""
+from functools import wraps
+
+import pandas as pd
+
+from . import medicion
+from .datos import LRU
+from .proyeccion import TOTAL
+
+MESES = ["Ene", "Feb", "Mar", "Abr", "May", "Jun",
+         "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+NOMBRES_MES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+               "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
+TAMANO_CACHE = 256
+
+AZUL = '#2635bf'
+NARANJA = '#dd722a'
+AGUAMARINA = '#81D3CD'
+AMARILLO = '#F7B261'
+
+figuras = LRU(TAMANO_CACHE, 'figuras')
+medicion.registrar('figuras', figuras.estado)
+
+
+def memoizada(alcance):
+    """La figura depende de `clave`, `corte` y la versión de cada fuente de datos."""
+    def decorador(construir):
+        # Solo se mide la construcción, no los aciertos de la caché.
+        medida = medicion.tramo(f'figura {construir.__name__}')(construir)
+
+        @wraps(construir)
+        def envoltura(ejec, clave, corte, *otras):
+            versiones = tuple(i.version for i in (ejec,) + otras)
+            return figuras.obtener((alcance, clave, corte) + versiones,
+                                   lambda: medida(ejec, clave, corte, *otras))
+        return envoltura
+    return decorador
+
+
+def perdida(proy, dimension=TOTAL, clave=TOTAL):
+    """Pérdida de apropiación proyectada a diciembre, en %."""
+    return 100 - round(proy.serie(dimension, clave).loc[12, 'perc_compr'] * 100, 1)
+
+
+def porcentajes(df):
+    return df.assign(perc_ejecucion=lambda x: x['OBLIGACION'] / x['APR. VIGENTE'] * 100,
+                     perc_compr=lambda x: x['COMPROMISO'] / x['APR. VIGENTE'] * 100)
+
+
+def ranking(ejec, dimension, corte):
+    """Sumas y porcentajes de cada sector o entidad en el mes de corte."""
+    return (porcentajes(ejec.corte(dimension, corte))
+            .round({'perc_ejecucion': 1, 'perc_compr': 1}))
+
+
+def _serie(fig, valores, corte, col, observado, proyectado):
+    """Agrega la parte observada y la proyectada de una serie de 12 meses."""
+    import plotly.graph_objects as go
+
+    fig.add_trace(go.Scatter(x=MESES[:corte + 1],
+                             y=valores[:corte + 1],
+                             mode='lines+markers',
+                             **observado), row=1, col=col)
+    fig.add_trace(go.Scatter(x=MESES[corte:],
+                             y=valores[corte:],
+                             mode='lines+markers',
+                             name='Pronóstico',
+                             **proyectado), row=1, col=col)
+
+
+def _meta(fig, col, y, color):
+    fig.add_shape(type='line', x0=0, x1=11, y0=y, y1=y, line=dict(color=color, dash='dash'),
+                  row=1, col=col)
+
+
+def _layout(fig, titulo, leyenda):
+    fig.update_layout(
+        title=titulo,
+        height=400,
+        width=900,
+        legend=dict(orientation='h', **leyenda)
+    )
+
+
+@memoizada('general')
+def general(proy, _, corte):
+    """Ejecución y compromiso de todo el presupuesto, en billones y en %."""
+    from plotly.subplots import make_subplots
+
+    totales = proy.serie()
+    fig = make_subplots(rows=1, cols=2, subplot_titles=("Valores (billones)", "Porcentaje (%)"))
+    proyectado = dict(line=dict(color=AGUAMARINA, width=2, dash='dash'),
+                      marker=dict(color=AGUAMARINA, size=8))
+
+    for col, escala in [(1, (totales[['OBLIGACION', 'COMPROMISO']] / 1_000_000_000_000)),
+                        (2, totales[['perc_ejecucion', 'perc_compr']] * 100)]:
+        ejecutado, comprometido = [escala[c].round(1).tolist() for c in escala.columns]
+        _serie(fig, ejecutado, corte, col,
+               dict(name='Ejecutado', showlegend=col == 2, line=dict(color=NARANJA)),
+               dict(showlegend=col == 1, **proyectado))
+        _serie(fig, comprometido, corte, col,
+               dict(name='Comprometido', showlegend=col == 2, line=dict(color=AZUL)),
+               dict(showlegend=False, **proyectado))
+
+    apropiacion = (totales['APR. VIGENTE'] / 1_000_000_000_000).round(1)
+    _meta(fig, 1, apropiacion[corte], AZUL)
+    _meta(fig, 2, 100, AZUL)
+    _layout(fig, f"Ejecución y compromiso general al mes de {NOMBRES_MES[corte - 1]}",
+            dict(x=0.64, y=1.1, xanchor='left', yanchor='bottom'))
+    return fig
+
+
+@memoizada('arbol')
+def arbol(arb, clave, mes):
+    """Treemap o sunburst del clasificador de una entidad en un mes.
+
+    `clave` es (entidad, 'Treemap' o 'Sunburst'). El área es la apropiación
+    vigente y el color, el porcentaje comprometido.
+    """
+    import plotly.graph_objects as go
+
+    entidad, forma = clave
+    nodos = arb.nodos(entidad, mes)
+    etiquetas = nodos['codigo'].where(nodos['nombre'] == nodos['codigo'],
+                                      nodos['codigo'] + ' ' + nodos['nombre'].str.capitalize())
+    Grafico = go.Treemap if forma == 'Treemap' else go.Sunburst
+    fig = go.Figure(Grafico(
+        ids=nodos['id'],
+        parents=nodos['padre'],
+        labels=etiquetas,
+        values=nodos['propio'],
+        branchvalues='remainder',
+        customdata=pd.DataFrame({'apr': nodos['APR. VIGENTE'] / 1_000_000_000,
+                                 'compr': nodos['perc_compr'] * 100}),
+        hovertemplate="%{label}<br>Apr. vigente: %{customdata[0]:,.1f} mmil"
+                      "<br>Comprometido: %{customdata[1]:.1f}%<extra></extra>",
+        marker=dict(colors=(nodos['perc_compr'] * 100).round(1),
+                    colorscale=[[0, NARANJA], [0.5, AMARILLO], [1, AGUAMARINA]],
+                    cmin=0, cmax=100,
+                    colorbar=dict(title="Comprometido (%)"))))
+    fig.update_layout(title=f"Clasificador de gastos de {entidad} al mes de {NOMBRES_MES[mes - 1]}",
+                      height=600,
+                      margin=dict(t=60, l=10, r=10, b=10))
+    return fig
+
+
+def vigencias(totales):
+    """Curvas de ejecución y compromiso acumulados de varias vigencias, en %.
+
+    `totales` son los totales mensuales con índice (anio, mes_num), como los
+    de `datos.Almacen.totales`.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=1, cols=2, subplot_titles=("Ejecutado (%)", "Comprometido (%)"))
+    for col, columna in [(1, 'perc_ejecucion'), (2, 'perc_compr')]:
+        for anio, serie in (totales[columna] * 100).round(1).groupby(level='anio'):
+            serie = serie.droplevel('anio')
+            fig.add_trace(go.Scatter(x=[MESES[i - 1] for i in serie.index],
+                                     y=serie.tolist(),
+                                     mode='lines+markers',
+                                     name=str(anio),
+                                     legendgroup=str(anio),
+                                     showlegend=col == 1), row=1, col=col)
+    _meta(fig, 1, 100, AZUL)
+    _meta(fig, 2, 100, AZUL)
+    _layout(fig, "Ejecución y compromiso acumulados por vigencia",
+            dict(x=1, y=1.1, xanchor='right', yanchor='bottom'))
+    return fig
+
+
+def _barras(izquierda, derecha, dimension, subtitulos, nombres, titulo, leyenda_x,
+            etiquetas=True):
+    """Dos rankings horizontales lado a lado con la referencia del 100 %."""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=1, cols=2, subplot_titles=subtitulos)
+    for col, (tops, valor), nombre, color in zip([1, 2], [izquierda, derecha], nombres,
+                                                 [AMARILLO, AGUAMARINA]):
+        if etiquetas:
+            texto = dict(text=tops[dimension], textposition='inside', hoverinfo='x')
+        else:
+            texto = dict(hovertext=tops[dimension], hoverinfo='x+text')
+        fig.add_trace(go.Bar(y=tops[dimension],
+                             x=tops[valor],
+                             name=nombre,
+                             marker_color=color,
+                             orientation='h',
+                             **texto), row=1, col=col)
+    for col, color in [(1, NARANJA), (2, AGUAMARINA)]:
+        fig.add_shape(type='line', x0=100, x1=100, y0=-0.5, y1=9.5,
+                      line=dict(color=color, width=1, dash='dash'),
+                      row=1, col=col)
+    fig.update_yaxes(showticklabels=False)
+    _layout(fig, titulo, dict(x=leyenda_x, y=1.1, xanchor='left', yanchor='bottom'))
+    return fig
+
+
+def _top(piv, columna, ascendente=True):
+    return piv.sort_values(by=columna, ascending=ascendente).tail(10).reset_index()
+
+
+@memoizada('top_sectores')
+def top_sectores(ejec, _, corte):
+    piv_s = ranking(ejec, 'Sector', corte)
+    return _barras((_top(piv_s, 'perc_ejecucion'), 'perc_ejecucion'),
+                   (_top(piv_s, 'perc_compr'), 'perc_compr'),
+                   'Sector',
+                   ("Ejecutado (%)", "Comprometido (%)"),
+                   ['Ejecutado', 'Comprometido'],
+                   f"Top 10 sectores por ejecución (al mes de {NOMBRES_MES[corte - 1]}) ",
+                   0.72)
+
+
+@memoizada('top_entidades')
+def top_entidades(ejec, _, corte):
+    piv_e = ranking(ejec, 'Entidad', corte)
+    return _barras((_top(piv_e, 'perc_ejecucion'), 'perc_ejecucion'),
+                   (_top(piv_e, 'perc_compr'), 'perc_compr'),
+                   'Entidad',
+                   ("Ejecutado (%)", "Pérdida de aprop. (%)"),
+                   ['Ejecutado', 'Comprometido'],
+                   f"Top 10 entidades por ejecución (al mes de {NOMBRES_MES[corte - 1]})",
+                   0.72)
+
+
+@memoizada('rezagadas')
+def rezagadas(ejec, _, corte, perd):
+    """Entidades con menor ejecución y mayor pérdida de apropiación proyectada."""
+    piv_e = ranking(ejec, 'Entidad', corte)
+    mayor_perdida = (perd.top('Entidad', 10)
+                     .assign(perc_compr=lambda x: (x['perc_compr'] * 100).round(1))
+                     .iloc[::-1]
+                     .rename_axis('Entidad')
+                     .reset_index())
+    return _barras((_top(piv_e, 'perc_ejecucion', ascendente=False), 'perc_ejecucion'),
+                   (mayor_perdida, 'perc_compr'),
+                   'Entidad',
+                   ("Ejecutado (%)", "Comprometido a diciembre (%)"),
+                   ['Ejecutado', 'Pérdida de apropiación'],
+                   "Top 10 entidades con menor ejecución y mayor pérdida de apropiación "
+                   f"(al mes de {NOMBRES_MES[corte - 1]})",
+                   0.7,
+                   etiquetas=False)
+
+
+def mensual(proy, dimension, clave):
+    """Serie de 12 meses de un sector o entidad, en miles de millones y en %."""
+    serie = proy.serie(dimension, clave)
+    return (serie[['APR. VIGENTE', 'COMPROMISO', 'OBLIGACION']]
+            .div(1_000_000_000, axis=0)
+            .assign(perc_ejecucion=serie['perc_ejecucion'] * 100,
+                    perc_compr=serie['perc_compr'] * 100)
+            .round(1))
+
+
+def _seleccion(proy, dimension, clave, corte, articulo):
+    from plotly.subplots import make_subplots
+
+    piv = mensual(proy, dimension, clave)
+    fig = make_subplots(rows=1, cols=2, subplot_titles=("Ejecutado (%)", "Comprometido (%)"))
+    for col, columna in [(1, 'perc_ejecucion'), (2, 'perc_compr')]:
+        valores = piv[columna].tolist()
+        _serie(fig, valores, corte, col,
+               dict(name='Observado', showlegend=col == 2,
+                    line=dict(color=AZUL, width=2),
+                    marker=dict(color=[AZUL] * (corte + 1), size=8)),
+               dict(showlegend=col == 2,
+                    line=dict(color=NARANJA, width=2, dash='dash'),
+                    marker=dict(color=NARANJA, size=8)))
+    _meta(fig, 2, 100, AZUL)
+    _meta(fig, 1, 100, AZUL)
+    fig.update_yaxes(range=[0, max(100, max(valores))])
+    _layout(fig, f"Ejecución y compromiso al mes de {NOMBRES_MES[corte - 1]} {articulo}: {clave}",
+            dict(yanchor="bottom", y=1.1, xanchor="right", x=1))
+    return fig
+
+
+@memoizada('Sector')
+def sector(proy, clave, corte):
+    return _seleccion(proy, 'Sector', clave, corte, 'por sector')
+
+
+@memoizada('Entidad')
+def entidad(proy, clave, corte):
+    return _seleccion(proy, 'Entidad', clave, corte, 'por entidad')
@@ -0,0 +1,245 @@
+"""Instantánea estática de la pestaña "Vista general".
+
+La parte de arriba de la vista general (las cinco cifras, el gráfico general,
+la comparación de vigencias, el aviso de pérdida y los tres rankings) es igual
+para todos los usuarios mientras no cambien los datos. En vez de calcularla y
+serializarla en cada sesión, se arma una vez, al terminar el ETL, como una
+página HTML con las figuras de Plotly embebidas en JSON. Con `kaleido` (ver
+requirements.txt) cada figura se exporta además a PNG y SVG.
+
+El tablero no manda la página en cada sesión: la copia a su carpeta `static/`
+(ver `estatica`), con un nombre que cambia con la versión, y la muestra en un
+iframe que la pide como archivo estático de Streamlit. plotly.js va aparte,
+en la misma carpeta y un solo archivo por versión de plotly, así que el
+navegador guarda los dos en caché y no depende de un CDN.
+
+La página guarda la versión del cubo, las proyecciones y las pérdidas con que
+se armó; si no coincide con la que está leyendo el tablero (o no existe), el
+tablero vuelve a calcular la vista. Con `EJECUCION_INSTANTANEA=0` no se usa.
+
+Uso:
+
+    python -m ejecucion.instantanea [--build build]
+"""
+import argparse
+import html
+import json
+import logging
+import os
+import time
+
+from . import cubo, datos, graficos, perdidas, proyeccion
+
+log = logging.getLogger(__name__)
+
+CARPETA = 'vista_general'
+PAGINA = 'vista_general.html'
+META = 'vista_general.json'
+FORMATOS = ['png', 'svg']
+ACTIVA = os.environ.get('EJECUCION_INSTANTANEA', '1') != '0'
+# Alto de las figuras (ver `graficos._layout`) más sus márgenes, y del resto.
+ALTO_FIGURA = 420
+ALTO_ENCABEZADO = 200
+ESTATICA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+# Las páginas de versiones anteriores se borran después de este tiempo, como
+# las exportaciones.
+VIGENCIA = 3600
+
+ESTILO = """
+body { font-family: "Source Sans Pro", sans-serif; margin: 0; color: #31333f; }
+.cifras { display: flex; gap: 1rem; }
+.cifra { flex: 1; }
+.cifra .etiqueta { font-size: 0.875rem; }
+.cifra .valor { font-size: 2.25rem; }
+.aviso { padding: 1rem; border-radius: 0.5rem; margin: 1rem 0; }
+.error { background: rgba(255, 43, 43, 0.09); color: #7d353b; }
+.exito { background: rgba(33, 195, 84, 0.1); color: #177233; }
+"""
+
+
+class Instantanea:
+
+    def __init__(self, pagina, meta, version):
+        self.pagina = pagina
+        self.alto = meta['alto']
+        self.fuentes = meta['fuentes']
+        self.version = version
+
+    def vigente(self, *fuentes):
+        """Si la página se armó con la versión de `fuentes` (cubo, proyecciones, pérdidas)."""
+        return self.fuentes == [list(i.version) for i in fuentes]
+
+
+def cifras(ejec, corte):
+    """Las cinco cifras del encabezado de la vista general."""
+    totales = ejec.totales.loc[corte]
+    return {
+        "Apr. Vigente (bil)": round(totales['APR. VIGENTE'] / 1_000_000_000_000, 1),
+        "Ejecutado (bil)": round(totales['OBLIGACION'] / 1_000_000_000_000, 1),
+        "Comprometido (bil)": round(totales['COMPROMISO'] / 1_000_000_000_000, 1),
+        "% ejecutado (al mes actual)": round(totales['perc_ejecucion'] * 100, 1),
+        "% comprometido (al mes actual)": round(totales['perc_compr'] * 100, 1),
+    }
+
+
+def figuras(ejec, proy, perd, almacen):
+    """Figuras de la vista general, en el orden del tablero."""
+    corte = proy.corte
+    resultado = {'general': graficos.general(proy, None, corte)}
+    vigencias = almacen.vigencias()
+    if len(vigencias) > 1:
+        resultado['vigencias'] = graficos.vigencias(almacen.totales(vigencias[-3:]))
+    resultado['top_sectores'] = graficos.top_sectores(ejec, None, corte)
+    resultado['top_entidades'] = graficos.top_entidades(ejec, None, corte)
+    resultado['rezagadas'] = graficos.rezagadas(ejec, None, corte, perd)
+    return resultado
+
+
+def plotlyjs():
+    """Nombre del archivo de plotly.js que carga la página, al lado de ella."""
+    import plotly
+
+    return f'plotly-{plotly.__version__}.min.js'
+
+
+def pagina(cifras, perdida, figuras):
+    """HTML de la vista general con las figuras embebidas."""
+    import plotly.io as pio
+
+    partes = ['<div class="cifras">']
+    for etiqueta, valor in cifras.items():
+        partes.append(f'<div class="cifra"><div class="etiqueta">{html.escape(etiqueta)}</div>'
+                      f'<div class="valor">{valor}</div></div>')
+    partes.append('</div>')
+    for i, (nombre, fig) in enumerate(figuras.items()):
+        # El aviso de pérdida va antes de los rankings, como en el tablero.
+        if nombre == 'top_sectores':
+            if perdida > 0:
+                partes.append(f'<div class="aviso error">Hay una pérdida de apropiación '
+                              f'del {round(perdida, 2)}%.</div>')
+            else:
+                partes.append('<div class="aviso exito">No hay pérdida de apropiación.</div>')
+        partes.append(pio.to_html(fig, full_html=False, include_plotlyjs=plotlyjs() if i == 0 else False,
+                                  config={'displaylogo': False}))
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><style>{ESTILO}</style>'
+            f'</head><body>{"".join(partes)}</body></html>')
+
+
+def imagenes(figuras, carpeta):
+    """Exporta cada figura a PNG y SVG en `carpeta`, si se puede.
+
+    Es opcional: sin kaleido, o sin el Chrome que kaleido necesita, solo se
+    registra un aviso.
+    """
+    try:
+        import kaleido  # noqa: F401
+    except ImportError:
+        log.warning("kaleido no está instalado; la instantánea no tendrá PNG ni SVG")
+        return
+    os.makedirs(carpeta, exist_ok=True)
+    try:
+        for nombre, fig in figuras.items():
+            for formato in FORMATOS:
+                datos.reemplazar(os.path.join(carpeta, f'{nombre}.{formato}'),
+                                 lambda temporal: fig.write_image(temporal, format=formato))
+    except Exception as e:
+        log.warning("no se pudieron exportar las imágenes de la instantánea: %s", e)
+
+
+def _texto(texto):
+    def escribir_texto(temporal):
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    return escribir_texto
+
+
+def _escribir(texto, destino):
+    datos.reemplazar(destino, _texto(texto))
+
+
+def construir(build=None):
+    """Arma la instantánea de los datos de `build` (por defecto, la versión actual)."""
+    build = build or datos.base()
+    ejec = cubo.cargar(os.path.join(build, cubo.ARCHIVO))
+    proy = proyeccion.cargar(os.path.join(build, proyeccion.ARCHIVO))
+    perd = perdidas.cargar(os.path.join(build, perdidas.ARCHIVO))
+    almacen = datos.Almacen(os.path.join(build, datos.DATASET))
+    graficas = figuras(ejec, proy, perd, almacen)
+    texto = pagina(cifras(ejec, proy.corte), graficos.perdida(proy), graficas)
+    imagenes(graficas, os.path.join(build, CARPETA))
+    meta = {'alto': ALTO_ENCABEZADO + ALTO_FIGURA * len(graficas),
+            'fuentes': [list(i.version) for i in (ejec, proy, perd)]}
+    # La página primero: `cargar` mira la meta.
+    _escribir(texto, os.path.join(build, PAGINA))
+    _escribir(json.dumps(meta), os.path.join(build, META))
+    return os.path.join(build, PAGINA)
+
+
+def al_dia(build=None):
+    """Si la instantánea de `build` corresponde a sus datos actuales."""
+    build = build or datos.base()
+    try:
+        with open(os.path.join(build, META), 'r') as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return False
+    return meta['fuentes'] == [list(datos.firma(os.path.abspath(os.path.join(build, i))))
+                               for i in (cubo.ARCHIVO, proyeccion.ARCHIVO, perdidas.ARCHIVO)]
+
+
+def leer(ruta, version):
+    meta = os.path.join(os.path.dirname(ruta), META)
+    with open(ruta, 'r', encoding='utf-8') as f, open(meta, 'r') as g:
+        return Instantanea(f.read(), json.load(g), version)
+
+
+def cargar(ruta=None):
+    """La instantánea de la versión actual, o None si no hay."""
+    ruta = ruta or datos.ruta(META)
+    if not os.path.exists(ruta):
+        return None
+    return datos.en_cache(ruta, 'instantanea',
+                          lambda ruta, version: leer(os.path.join(os.path.dirname(ruta), PAGINA),
+                                                     version))
+
+
+def estatica(vista, carpeta=ESTATICA):
+    """Ruta de la página de `vista` dentro de `carpeta`, la de archivos estáticos.
+
+    La primera vez que se pide una versión se escriben la página y, si falta,
+    plotly.js; las páginas de otras versiones sin cambios hace `VIGENCIA`
+    segundos se borran.
+    """
+    relativa = f"{CARPETA}/{'-'.join(map(str, vista.version))}.html"
+    destino = os.path.join(carpeta, relativa)
+    if os.path.exists(destino):
+        return relativa
+    js = os.path.join(carpeta, CARPETA, plotlyjs())
+    if not os.path.exists(js):
+        from plotly.offline import get_plotlyjs
+
+        datos.reemplazar(js, _texto(get_plotlyjs()))
+    datos.reemplazar(destino, _texto(vista.pagina))
+    limite = time.time() - VIGENCIA
+    for nombre in os.listdir(os.path.dirname(destino)):
+        vieja = os.path.join(os.path.dirname(destino), nombre)
+        try:
+            if nombre.endswith('.html') and vieja != destino and os.path.getmtime(vieja) < limite:
+                os.remove(vieja)
+        except OSError:
+            # Otra sesión la borró primero.
+            pass
+    return relativa
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--build', default=datos.BUILD,
+                        help='carpeta de build; se usa su versión publicada')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    print(f"Instantánea en {construir(datos.publicada(args.build))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Medición de cada ejecución del tablero.
+
+Cada ejecución de app.py abre una traza (`iniciar`) y marca sus etapas con
+`tramo`, que sirve como `with` o como decorador; los tramos se anidan, así que
+la traza queda como un árbol de tiempos: carga de los datos, cada pestaña, la
+construcción de cada figura y su envío al navegador. Al cerrar la traza
+(`terminar`) se le agregan los aciertos y fallos de las cachés registradas
+durante esa ejecución y la memoria que ocupan los DataFrames en uso. Las cachés
+los cuentan en la traza del hilo (`contar`), no en contadores del proceso.
+
+El registro de cada ejecución se emite como una línea JSON en el logger
+`ejecucion.medicion`; con la variable de entorno `EJECUCION_MEDICION` se
+escribe además en ese archivo. El tablero lo muestra en un panel de
+diagnóstico si se abre con `?diagnostico=1`.
+
+La traza es del hilo, así que sesiones distintas no se mezclan, y fuera de una
+traza `tramo` no hace nada.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import ContextDecorator
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+ARCHIVO = os.environ.get('EJECUCION_MEDICION')
+
+_actual = threading.local()
+_caches = {}
+_memorias = {}
+
+
+class Traza:
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.fecha = datetime.now().isoformat(timespec='milliseconds')
+        self.inicio = time.perf_counter()
+        self.tramos = []
+        self.abiertos = []
+        self.caches = {}
+
+    def registro(self):
+        return {'traza': self.nombre,
+                'fecha': self.fecha,
+                'segundos': round(time.perf_counter() - self.inicio, 4),
+                'tramos': self.tramos}
+
+
+class tramo(ContextDecorator):
+    """Marca una etapa de la ejecución en curso, como `with` o como decorador."""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        traza = actual()
+        if traza is not None:
+            tramo = {'nombre': self.nombre, 'nivel': len(traza.abiertos),
+                     'desde': round(time.perf_counter() - traza.inicio, 4), 'segundos': None}
+            # Se agrega al abrir, así los tramos quedan en orden de inicio.
+            traza.tramos.append(tramo)
+            traza.abiertos.append((tramo, time.perf_counter()))
+        return self
+
+    def __exit__(self, *exc):
+        traza = actual()
+        if traza is not None and traza.abiertos:
+            tramo, inicio = traza.abiertos.pop()
+            tramo['segundos'] = round(time.perf_counter() - inicio, 4)
+        return False
+
+
+def registrar(nombre, estado):
+    """Registra una caché; `estado()` devuelve, entre otras cosas, sus entradas."""
+    _caches[nombre] = estado
+
+
+def contar(nombre, acierto):
+    """Suma un acierto o un fallo de la caché `nombre` a la traza del hilo."""
+    traza = actual()
+    if traza is not None:
+        cuenta = traza.caches.setdefault(nombre, {'aciertos': 0, 'fallos': 0})
+        cuenta['aciertos' if acierto else 'fallos'] += 1
+
+
+def iniciar(nombre='app'):
+    """Abre una traza nueva para el hilo actual."""
+    _actual.traza = Traza(nombre)
+    return _actual.traza
+
+
+def actual():
+    return getattr(_actual, 'traza', None)
+
+
+def memoria(obj):
+    """Bytes que ocupa en memoria el DataFrame de `obj`, calculado una vez por versión."""
+    clave = (id(obj), obj.version)
+    if clave not in _memorias:
+        if len(_memorias) > 64:
+            _memorias.clear()
+        _memorias[clave] = int(obj.df.memory_usage(deep=True).sum())
+    return _memorias[clave]
+
+
+def terminar(**objetos):
+    """Cierra la traza del hilo, la emite al log y devuelve su registro.
+
+    `objetos` son los datos en uso, con atributos `df` y `version`, o
+    directamente los bytes que ocupan, para reportar su memoria.
+    """
+    traza = actual()
+    if traza is None:
+        return None
+    _actual.traza = None
+    registro = traza.registro()
+    caches = {}
+    for nombre, estado in _caches.items():
+        cuenta = traza.caches.get(nombre, {})
+        caches[nombre] = {'aciertos': cuenta.get('aciertos', 0),
+                          'fallos': cuenta.get('fallos', 0),
+                          'entradas': estado()['entradas']}
+    registro['caches'] = caches
+    registro['memoria'] = {nombre: obj if isinstance(obj, int) else memoria(obj)
+                           for nombre, obj in objetos.items()}
+    if log.isEnabledFor(logging.INFO):
+        log.info(json.dumps(registro, ensure_ascii=False))
+    return registro
+
+
+def configurar(archivo=ARCHIVO):
+    """Escribe los registros del logger en `archivo`, una línea JSON por ejecución."""
+    if not archivo:
+        return
+    archivo = os.path.abspath(archivo)
+    if any(getattr(h, 'baseFilename', None) == archivo for h in log.handlers):
+        return
+    manejador = logging.FileHandler(archivo, encoding='utf-8')
+    manejador.setFormatter(logging.Formatter('%(message)s'))
+    log.addHandler(manejador)
+    log.setLevel(logging.INFO)
@@ -0,0 +1,78 @@
+"""Ranking de pérdida de apropiación proyectada.
+
+La pérdida de apropiación es la parte de la apropiación vigente que no se
+alcanza a comprometer en el año, según las proyecciones a diciembre
+(`ejecucion.proyeccion`). Se calcula de una vez para todos los sectores,
+entidades y unidades, y se guarda solo el top `K` de cada dimensión, ordenado
+de mayor a menor pérdida.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from . import datos, proyeccion
+
+ARCHIVO = 'perdidas.parquet'
+K = 50
+
+
+class Perdidas:
+
+    def __init__(self, df, version):
+        self.df = df
+        self.version = version
+        self.modelos = [m for m in proyeccion.MODELOS if m in set(df['modelo'])]
+        # Sin filas (ninguna clave con pérdida calculable) `top` queda vacío.
+        self.modelo = self.modelos[-1] if self.modelos else proyeccion.MODELOS[0]
+
+    def top(self, dimension, n=10, modelo=None):
+        """Las `n` claves de `dimension` con mayor pérdida, de mayor a menor."""
+        modelo = modelo or self.modelo
+        parte = self.df[(self.df['dimension'] == dimension) & (self.df['modelo'] == modelo)]
+        return parte.head(n).set_index('clave')
+
+
+def top(valores, k):
+    """Posiciones de los `k` mayores de `valores`, de mayor a menor.
+
+    Selección parcial con `argpartition` (O(n)) y orden solo de los `k`
+    elegidos; los NaN no se consideran.
+    """
+    valores = np.asarray(valores, dtype='float64')
+    validos = np.flatnonzero(~np.isnan(valores))
+    k = min(k, len(validos))
+    if k == 0:
+        return validos
+    elegidos = validos[np.argpartition(-valores[validos], k - 1)[:k]]
+    return elegidos[np.argsort(-valores[elegidos], kind='stable')]
+
+
+def tabla(proyecciones, k=K):
+    """Top `k` de pérdida de cada dimensión y modelo de la tabla de `proyecciones`."""
+    cierre = proyecciones[(proyecciones['mes_num'] == 12)
+                          & (proyecciones['dimension'] != proyeccion.TOTAL)]
+    cierre = cierre.assign(perdida=cierre['APR. VIGENTE'] - cierre['COMPROMISO'],
+                           perc_perdida=1 - cierre['perc_compr'])
+    partes = []
+    for (dimension, modelo), grupo in cierre.groupby(['dimension', 'modelo'], sort=False):
+        grupo = grupo.iloc[top(grupo['perc_perdida'], k)]
+        partes.append(grupo.assign(posicion=np.arange(1, len(grupo) + 1)))
+    columnas = ['dimension', 'modelo', 'posicion', 'clave', 'APR. VIGENTE', 'COMPROMISO',
+                'perc_compr', 'perdida', 'perc_perdida']
+    if not partes:
+        return cierre.reindex(columns=columnas)
+    return pd.concat(partes, ignore_index=True)[columnas]
+
+
+def construir(fuente=None, salida=None, k=K):
+    """Calcula el ranking a partir de las proyecciones y lo escribe en `salida`."""
+    fuente = fuente or datos.ruta(proyeccion.ARCHIVO)
+    salida = salida or datos.ruta(ARCHIVO)
+    df = tabla(pq.read_table(fuente).to_pandas(), k)
+    datos.escribir(pa.Table.from_pandas(df, preserve_index=False), salida)
+
+
+def cargar(ruta=None):
+    return datos.en_cache(ruta or datos.ruta(ARCHIVO), 'perdidas',
+                          lambda ruta, version: Perdidas(pd.read_parquet(ruta), version))
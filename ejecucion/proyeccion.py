@@ -0,0 +1,173 @@
+"""Proyección de la ejecución hasta diciembre.
+
+El mes de corte es el último `mes_num` con datos (o el que se pida). Todas las
+series (el total y cada sector, entidad y unidad) se proyectan a la vez como
+un arreglo de NumPy de forma (series, 12 meses, medidas), con dos modelos:
+
+- lineal: cada mes se compromete y obliga lo mismo que el promedio hasta el
+  corte (el pronóstico que hacía el tablero).
+- estacional: el acumulado sigue el perfil mensual promedio de vigencias
+  anteriores, es decir, la fracción del valor de diciembre alcanzada en cada
+  mes. Solo se calcula si se entregan datos de otros años.
+
+Los dos modelos son el mismo cálculo con distinto perfil: el lineal es el
+perfil m/12. La apropiación vigente se mantiene en el valor del corte.
+
+El resultado se guarda como una tabla larga (dimensión, clave, modelo, mes)
+que el tablero lee sin recalcular nada.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from . import cubo, datos
+
+ARCHIVO = 'proyecciones.parquet'
+
+DIMENSIONES = ['Sector', 'Entidad', 'Unidad']
+TOTAL = 'Total'
+MODELOS = ['lineal', 'estacional']
+MESES = np.arange(1, 13)
+
+
+class Proyecciones:
+
+    def __init__(self, df, version, corte):
+        self.df = df
+        self.version = version
+        self.corte = corte
+        self.modelos = [m for m in MODELOS if m in set(df['modelo'])]
+        # El estacional, si hay historia para ajustarlo.
+        self.modelo = self.modelos[-1]
+        self._indices = {}
+
+    def _indice(self, dimension, modelo):
+        if (dimension, modelo) not in self._indices:
+            parte = self.df[(self.df['dimension'] == dimension) & (self.df['modelo'] == modelo)]
+            self._indices[dimension, modelo] = datos.Indice(parte.set_index('mes_num'), 'clave')
+        return self._indices[dimension, modelo]
+
+    def series(self, dimension, modelo=None):
+        """`Indice` por clave de las series de `dimension`."""
+        return self._indice(dimension, modelo or self.modelo)
+
+    def serie(self, dimension=TOTAL, clave=TOTAL, modelo=None):
+        """Los 12 meses de una serie, observados hasta el corte y proyectados después."""
+        return self._indice(dimension, modelo or self.modelo)[clave]
+
+    def cierre(self, dimension, modelo=None):
+        """Valores proyectados a diciembre de todas las claves de `dimension`."""
+        parte = self._indice(dimension, modelo or self.modelo).df
+        return parte.loc[12].set_index('clave')
+
+
+def perfil_lineal():
+    """Fracción del valor de diciembre acumulada en cada mes: m/12."""
+    perfil = np.repeat((MESES / 12)[:, None], len(datos.SUMAS), axis=1)
+    perfil[:, datos.SUMAS.index('APR. VIGENTE')] = 1
+    return perfil
+
+
+def perfil_estacional(historia):
+    """Perfil mensual promedio de las vigencias de `historia`.
+
+    `historia` es una lista de totales mensuales (índice mes_num, columnas
+    SUMAS) de años completos; los que no tienen los 12 meses se ignoran.
+    """
+    fracciones = []
+    for totales in historia:
+        totales = totales[datos.SUMAS].reindex(MESES)
+        if totales.isna().any().any():
+            continue
+        fracciones.append(totales.to_numpy() / totales.loc[12].to_numpy())
+    if not fracciones:
+        return None
+    perfil = np.mean(fracciones, axis=0)
+    perfil[:, datos.SUMAS.index('APR. VIGENTE')] = 1
+    return perfil
+
+
+def matriz(df, dimension, corte):
+    """Claves de `dimension` y arreglo (claves, 12, SUMAS) con los meses hasta `corte`."""
+    if dimension == TOTAL:
+        df = df.assign(**{TOTAL: TOTAL})
+    tabla = (df[df['mes_num'] <= corte]
+             .groupby([dimension, 'mes_num'], observed=True)[datos.SUMAS].sum()
+             .unstack('mes_num')
+             .reindex(columns=pd.MultiIndex.from_product([datos.SUMAS, MESES])))
+    valores = tabla.to_numpy().reshape(len(tabla), len(datos.SUMAS), 12).transpose(0, 2, 1)
+    valores[:, :corte] = np.nan_to_num(valores[:, :corte])
+    return list(tabla.index), valores
+
+
+def proyectar(valores, corte, perfil):
+    """Completa los meses posteriores a `corte` de `valores` según `perfil`.
+
+    `valores` tiene forma (series, 12, medidas) y `perfil` (12, medidas).
+    """
+    valores = valores.copy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = perfil[corte:] / perfil[corte - 1]
+    valores[:, corte:] = valores[:, corte - 1:corte] * factor
+    return valores
+
+
+def tabla(df, corte=None, historia=None):
+    """Proyecciones de todas las series de `df` (cubo o dataset por rubro)."""
+    ultimo = int(df['mes_num'].max())
+    corte = corte or ultimo
+    if corte > ultimo:
+        raise ValueError(f"El mes de corte ({corte}) es posterior al último mes con datos "
+                         f"({ultimo}).")
+    perfiles = {'lineal': perfil_lineal()}
+    estacional = perfil_estacional(historia or [])
+    if estacional is not None:
+        perfiles['estacional'] = estacional
+
+    apr, comp, obl = (datos.SUMAS.index(c) for c in ['APR. VIGENTE', 'COMPROMISO', 'OBLIGACION'])
+    partes = []
+    for dimension in [TOTAL] + DIMENSIONES:
+        claves, valores = matriz(df, dimension, corte)
+        for modelo, perfil in perfiles.items():
+            proyectado = proyectar(valores, corte, perfil)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ejecucion = proyectado[..., obl] / proyectado[..., apr]
+                compromiso = proyectado[..., comp] / proyectado[..., apr]
+            parte = pd.DataFrame(proyectado.reshape(-1, len(datos.SUMAS)), columns=datos.SUMAS)
+            parte.insert(0, 'mes_num', np.tile(MESES, len(claves)).astype('int8'))
+            parte.insert(0, 'modelo', modelo)
+            parte.insert(0, 'clave', np.repeat(np.asarray(claves, dtype=object), 12))
+            parte.insert(0, 'dimension', dimension)
+            parte['perc_ejecucion'] = ejecucion.ravel()
+            parte['perc_compr'] = compromiso.ravel()
+            parte['proyectado'] = parte['mes_num'] > corte
+            partes.append(parte)
+    return pd.concat(partes, ignore_index=True), corte
+
+
+def construir(fuente=None, salida=None, corte=None, historia=None):
+    """Calcula las proyecciones a partir del cubo y las escribe en `salida`.
+
+    `historia` son rutas a datasets de vigencias anteriores para el modelo
+    estacional.
+    """
+    fuente = fuente or datos.ruta(cubo.ARCHIVO)
+    salida = salida or datos.ruta(ARCHIVO)
+    df = datos.leer(fuente, cubo.DIMENSIONES + datos.SUMAS)
+    totales = [datos.totales_mensuales(datos.leer(i, ['mes_num'] + datos.SUMAS))
+               for i in historia or []]
+    proyecciones, corte = tabla(df, corte, totales)
+    tabla_pa = pa.Table.from_pandas(proyecciones, preserve_index=False)
+    tabla_pa = tabla_pa.replace_schema_metadata({**tabla_pa.schema.metadata,
+                                                 b'corte': str(corte).encode()})
+    datos.escribir(tabla_pa, salida)
+
+
+def leer(ruta, version):
+    corte = int(pq.read_schema(ruta).metadata[b'corte'])
+    return Proyecciones(pq.read_table(ruta, memory_map=True).to_pandas(), version, corte)
+
+
+def cargar(ruta=None):
+    return datos.en_cache(ruta or datos.ruta(ARCHIVO), 'proyecciones', leer)
@@ -0,0 +1,163 @@
+"""Publicación de versiones de los datos y refresco en segundo plano.
+
+Cada corrida del ETL escribe en una carpeta de versión nueva,
+`build/versiones/<marca de tiempo>/`, que empieza como copia de la publicada
+hecha con enlaces duros (no copia bytes; el ETL reemplaza archivos, nunca los
+modifica, así que la versión anterior no cambia). Cuando el ETL termina, el
+puntero `build/actual.json` se reemplaza de forma atómica por uno que apunta a
+la carpeta nueva: el tablero ve la versión anterior o la nueva completa, nunca
+archivos a medio escribir. Si la corrida no cambió nada, la carpeta nueva se
+descarta. Se conservan las últimas `CONSERVAR` versiones, para las sesiones
+que todavía estén leyendo una anterior.
+
+`vigilar` revisa cada `INTERVALO` segundos si cambiaron `datasets/` o
+`dictios/` y publica una versión nueva cuando es así. Un error en el ETL se
+registra y la versión publicada sigue siendo la última buena.
+
+Uso:
+
+    python -m ejecucion.refresco [--intervalo SEGUNDOS]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from . import arbol, catalogo, cubo, datos, etl, instantanea, perdidas, proyeccion
+
+log = logging.getLogger(__name__)
+
+VERSIONES = 'versiones'
+CONSERVAR = 3
+INTERVALO = 60
+BLOQUEO = '.publicando'
+ARCHIVOS = [datos.DATASET, catalogo.ARCHIVO, cubo.ARCHIVO, arbol.ARCHIVO, proyeccion.ARCHIVO,
+            perdidas.ARCHIVO, instantanea.PAGINA, instantanea.META, instantanea.CARPETA]
+
+
+@contextmanager
+def bloqueo(build=datos.BUILD):
+    """Un solo proceso publica a la vez en `build`."""
+    os.makedirs(build, exist_ok=True)
+    with open(os.path.join(build, BLOQUEO), 'w') as f:
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _enlazar(origen, destino):
+    try:
+        os.link(origen, destino)
+    except OSError:
+        shutil.copy2(origen, destino)
+
+
+def copiar(origen, destino):
+    """Copia los archivos de datos de `origen` a `destino` con enlaces duros."""
+    os.makedirs(destino)
+    for nombre in ARCHIVOS:
+        ruta = os.path.join(origen, nombre)
+        if os.path.isdir(ruta):
+            shutil.copytree(ruta, os.path.join(destino, nombre), copy_function=_enlazar)
+        elif os.path.isfile(ruta):
+            _enlazar(ruta, os.path.join(destino, nombre))
+
+
+def apuntar(version, build=datos.BUILD):
+    """Publica `version` reemplazando el puntero de forma atómica."""
+    def escribir_json(temporal):
+        with open(temporal, 'w') as f:
+            json.dump({'version': os.path.relpath(version, build)}, f)
+
+    datos.reemplazar(os.path.join(build, datos.PUNTERO), escribir_json)
+
+
+def limpiar(build=datos.BUILD, conservar=CONSERVAR):
+    """Borra las versiones más viejas, salvo la publicada y las `conservar` últimas."""
+    carpeta = os.path.join(build, VERSIONES)
+    publicada = os.path.abspath(datos.publicada(build))
+    for nombre in sorted(os.listdir(carpeta))[:-conservar]:
+        ruta = os.path.join(carpeta, nombre)
+        if os.path.abspath(ruta) != publicada:
+            shutil.rmtree(ruta, ignore_errors=True)
+
+
+def publicar(datasets=etl.DATASETS, dictios=etl.DICTIOS, build=datos.BUILD, **opciones):
+    """Corre el ETL sobre una versión nueva y la publica si cambió algo.
+
+    `opciones` se pasan a `etl.actualizar`. Devuelve la carpeta publicada (o
+    None si no hubo cambios) y los libros procesados.
+    """
+    with bloqueo(build):
+        anterior = datos.publicada(build)
+        version = os.path.join(build, VERSIONES, datetime.now().strftime('%Y%m%d-%H%M%S-%f'))
+        copiar(anterior, version)
+        try:
+            procesados = etl.actualizar(datasets, dictios, version, **opciones)
+        except BaseException:
+            shutil.rmtree(version, ignore_errors=True)
+            raise
+        if anterior != build and datos.firma(version) == datos.firma(anterior):
+            shutil.rmtree(version)
+            return None, procesados
+        apuntar(version, build)
+        limpiar(build)
+        log.info("versión publicada: %s", version)
+        return version, procesados
+
+
+def vigilar(datasets=etl.DATASETS, dictios=etl.DICTIOS, build=datos.BUILD,
+            intervalo=INTERVALO, detener=None, **opciones):
+    """Publica una versión nueva cada vez que cambian `datasets` o `dictios`.
+
+    Corre hasta que se active el evento `detener`.
+    """
+    detener = detener or threading.Event()
+    vista = None
+    while not detener.is_set():
+        actual = (datos.firma(datasets), datos.firma(dictios))
+        if actual != vista:
+            try:
+                publicar(datasets, dictios, build, **opciones)
+                vista = actual
+            except Exception:
+                log.exception("no se pudo actualizar; se mantiene la versión publicada")
+        detener.wait(intervalo)
+
+
+def iniciar(intervalo=INTERVALO, **opciones):
+    """Lanza `vigilar` en un hilo de fondo y devuelve el evento para detenerlo."""
+    detener = threading.Event()
+    threading.Thread(target=vigilar, kwargs=dict(intervalo=intervalo, detener=detener, **opciones),
+                     name='refresco', daemon=True).start()
+    return detener
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--datasets', default=etl.DATASETS)
+    parser.add_argument('--dictios', default=etl.DICTIOS)
+    parser.add_argument('--build', default=datos.BUILD)
+    parser.add_argument('--intervalo', type=float, default=INTERVALO,
+                        help='segundos entre revisiones de las carpetas de entrada')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    try:
+        vigilar(args.datasets, args.dictios, args.build, args.intervalo)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Cada regla de error de `calidad` detiene la publicación."""
+import json
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from ejecucion import calidad, datos, etl, refresco
+from ejecucion.calidad import ErrorCalidad
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DICS = {'sector': {'1': 'Sector uno'},
+        'entidad': {'102': 'Entidad uno'},
+        'unidad': {'10203': 'Unidad uno'}}
+
+
+def _fila(mes, rubro, compromiso, obligacion):
+    fila = {'UEJ': '01-02-03', 'NOMBRE UEJ': 'UNIDAD UNO', 'TIPO': 'A',
+            'CTA': 1, 'SUB\nCTA': 2, 'OBJ': 3, 'ORD': rubro,
+            'RUBRO': f'A-01-02-03-{rubro:03d}', 'DESCRIPCION': f'Rubro {rubro}',
+            'FUENTE': 'Nación', 'REC': 10, 'SIT': 'CSF', 'mes': mes}
+    fila.update({c: 1000.0 for c in datos.VALORES})
+    fila.update({'COMPROMISO': compromiso, 'OBLIGACION': obligacion,
+                 'ORDEN PAGO': obligacion, 'PAGOS': obligacion})
+    return fila
+
+
+@pytest.fixture
+def libros():
+    """Dos rubros en dos meses, con valores acumulados que cuadran."""
+    return pd.DataFrame([_fila('enero', 1, 100.0, 50.0),
+                         _fila('enero', 2, 200.0, 80.0),
+                         _fila('febrero', 1, 150.0, 90.0),
+                         _fila('febrero', 2, 260.0, 120.0)])
+
+
+def _pies(df):
+    """La fila de totales de cada libro."""
+    return df.groupby('mes_num', as_index=False)[datos.VALORES].sum()
+
+
+def _validar(libros, pies=None, dics=DICS, anteriores=None):
+    df = etl.transformar(libros, dics)
+    return calidad.validar(df, _pies(df) if pies is None else pies, dics, anteriores)
+
+
+def _errores(excinfo):
+    return {r['regla'] for r in excinfo.value.informe
+            if r['nivel'] == calidad.ERROR and r['filas']}
+
+
+def test_libros_validos(libros):
+    informe = _validar(libros)
+    assert not any(r['filas'] for r in informe)
+
+
+def test_uej_sin_forma(libros):
+    libros.loc[1, 'UEJ'] = 'TOTAL SECTOR'
+    with pytest.raises(ErrorCalidad) as excinfo:
+        _validar(libros)
+    assert _errores(excinfo) == {"UEJ con forma NN-NN-NN"}
+
+
+@pytest.mark.parametrize('nombre', ['sector', 'entidad'])
+def test_codigo_sin_nombre(libros, nombre):
+    dics = {**DICS, nombre: {}}
+    with pytest.raises(ErrorCalidad) as excinfo:
+        _validar(libros, dics=dics)
+    assert _errores(excinfo) == {f"códigos en dic_{nombre}"}
+
+
+def test_unidad_sin_nombre_solo_avisa(libros):
+    informe = _validar(libros, dics={**DICS, 'unidad': {}})
+    assert [r['filas'] for r in informe if r['regla'] == "códigos en dic_unidad"] == [4]
+
+
+def test_obligacion_mayor_que_compromiso(libros):
+    libros.loc[2, 'OBLIGACION'] = 160.0
+    with pytest.raises(ErrorCalidad) as excinfo:
+        _validar(libros)
+    assert _errores(excinfo) == {"COMPROMISO >= OBLIGACION"}
+
+
+def test_caida_del_total_de_la_vigencia(libros):
+    libros.loc[2, 'COMPROMISO'] = 95.0
+    libros.loc[3, 'COMPROMISO'] = 150.0
+    with pytest.raises(ErrorCalidad) as excinfo:
+        _validar(libros)
+    assert _errores(excinfo) == {"COMPROMISO acumulado de la vigencia"}
+
+
+def test_caida_contra_meses_publicados(libros):
+    df = etl.transformar(libros, DICS)
+    anteriores = df[df['mes_num'] == 1].assign(COMPROMISO=1e6)
+    with pytest.raises(ErrorCalidad) as excinfo:
+        _validar(libros[libros['mes'] == 'febrero'].copy(), anteriores=anteriores)
+    assert _errores(excinfo) == {"COMPROMISO acumulado de la vigencia"}
+
+
+def test_caida_de_un_rubro_solo_avisa(libros):
+    libros.loc[2, 'COMPROMISO'] = 90.0
+    libros.loc[3, 'COMPROMISO'] = 400.0
+    informe = _validar(libros)
+    assert [r['filas'] for r in informe if r['regla'] == "COMPROMISO acumulado por rubro"] == [1]
+
+
+@pytest.mark.parametrize('cambio', [
+    lambda pies: pies[pies['mes_num'] != 2],
+    lambda pies: pd.concat([pies, pies[pies['mes_num'] == 2]], ignore_index=True),
+], ids=['falta', 'duplicada'])
+def test_fila_de_totales_por_libro(libros, cambio):
+    pies = cambio(_pies(etl.transformar(libros.copy(), DICS)))
+    with pytest.raises(ErrorCalidad) as excinfo:
+        _validar(libros, pies)
+    assert _errores(excinfo) == {"una fila de totales por libro"}
+
+
+def test_totales_descuadrados(libros):
+    pies = _pies(etl.transformar(libros.copy(), DICS))
+    pies.loc[pies['mes_num'] == 2, 'APR. VIGENTE'] += 5000
+    with pytest.raises(ErrorCalidad) as excinfo:
+        _validar(libros, pies)
+    assert _errores(excinfo) == {"suma de las filas = fila de totales"}
+
+
+def test_publicar_no_cambia_la_version_si_falla(tmp_path):
+    datasets, dictios, build = tmp_path / 'datasets', tmp_path / 'dictios', tmp_path / 'build'
+    datasets.mkdir()
+    origen = os.path.join(RAIZ, etl.DATASETS)
+    libro, _ = etl.programacion(origen)
+    for nombre in [libro, 'enero.xlsx', 'febrero.xlsx']:
+        shutil.copy(os.path.join(origen, nombre), datasets)
+    shutil.copytree(os.path.join(RAIZ, etl.DICTIOS), dictios)
+
+    version, _ = refresco.publicar(str(datasets), str(dictios), str(build), procesos=1)
+    puntero = build / datos.PUNTERO
+    antes = puntero.read_bytes()
+    versiones = sorted(os.listdir(build / refresco.VERSIONES))
+
+    # Sin los nombres de sector, ninguna fila pasa la cobertura.
+    (dictios / 'dic_sector.json').write_text(json.dumps({}))
+    with pytest.raises(ErrorCalidad):
+        refresco.publicar(str(datasets), str(dictios), str(build), procesos=1)
+    assert puntero.read_bytes() == antes
+    assert sorted(os.listdir(build / refresco.VERSIONES)) == versiones
+    assert datos.publicada(str(build)) == version
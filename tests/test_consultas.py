@@ -0,0 +1,73 @@
+"""Los dos motores de `consultas` dan las mismas agregaciones."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from ejecucion import arbol, consultas, cubo, datos, etl
+from ejecucion.catalogo import NIVELES, NOMBRES
+
+pytest.importorskip('duckdb')
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    azar = np.random.default_rng(0)
+    n = 600
+    df = pd.DataFrame({
+        'Sector': azar.choice(['Salud', 'Educación', 'Hacienda'], n),
+        'Entidad': azar.choice(['E1', 'E2', 'E3', 'E4'], n),
+        'Unidad': azar.choice(['U1', 'U2'], n),
+        'Tipo de gasto': azar.choice(['Funcionamiento', 'Inversión'], n),
+        'mes_num': azar.integers(1, 5, n).astype('int8'),
+    })
+    for nivel, nombre in zip(NIVELES, NOMBRES):
+        codigos = azar.choice(['01', '02', '03'], n)
+        df[nivel] = codigos
+        df[nombre] = pd.Series([f"{nombre} {c}" for c in codigos], dtype=object)
+    # Rubros sin el último nivel del catálogo.
+    df.loc[df.index % 7 == 0, ['Ordinal_n', 'Ordinal']] = None
+    for columna in datos.VALORES:
+        df[columna] = azar.uniform(0, 1e9, n).round(2)
+    salida = tmp_path_factory.mktemp('consultas') / 'dataset'
+    etl.escribir(df, str(salida))
+    return str(salida)
+
+
+def _iguales(pandas, duckdb, claves):
+    pandas = pandas.sort_values(claves, ignore_index=True)
+    duckdb = duckdb.sort_values(claves, ignore_index=True)
+    pd.testing.assert_frame_equal(pandas, duckdb, check_dtype=False, check_categorical=False,
+                                  rtol=1e-12)
+
+
+@pytest.mark.parametrize('filtros', [None,
+                                     {'mes_num': 2},
+                                     {'Entidad': ['E1', 'E3'], 'Tipo de gasto': 'Inversión'}])
+def test_agregar_igual_en_los_dos_motores(dataset, filtros):
+    dimensiones = ['Sector', 'Entidad', 'mes_num']
+    resultados = [consultas.agregar(dimensiones, filtros, ruta=dataset, motor=motor)
+                  for motor in consultas.MOTORES]
+    _iguales(*resultados, dimensiones)
+
+
+def test_cubo_igual_en_los_dos_motores(dataset, tmp_path):
+    resultados = []
+    for motor in consultas.MOTORES:
+        salida = str(tmp_path / f'cubo-{motor}.parquet')
+        cubo.construir(dataset, salida, motor)
+        resultados.append(pd.read_parquet(salida))
+    _iguales(*resultados, cubo.DIMENSIONES)
+
+
+def test_arbol_igual_en_los_dos_motores(dataset, tmp_path):
+    resultados = []
+    for motor in consultas.MOTORES:
+        salida = str(tmp_path / f'arbol-{motor}.parquet')
+        arbol.construir(dataset, salida, motor)
+        resultados.append(pd.read_parquet(salida))
+    _iguales(*resultados, ['Entidad', 'mes_num', 'id'])
+
+
+def test_pandas_no_deja_el_dataset_en_cache(dataset):
+    consultas.agregar(['Sector'], ruta=dataset, motor='pandas')
+    assert not any(dataset in str(clave) for clave in datos._cache)
@@ -0,0 +1,88 @@
+"""La normalización vectorizada da lo mismo que las funciones fila por fila de exper.ipynb."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ejecucion import etl
+from ejecucion.catalogo import codigo
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Funciones originales de exper.ipynb.
+def f_cuenta(row):
+    cuenta = row['CTA']
+
+    if len(str(int(cuenta))) == 1:
+        return f"0{int(cuenta)}"
+    return str(int(cuenta))
+
+
+def f_subcuenta(row):
+    subcuenta = row['SUB\nCTA']
+    try:
+        if len(str(int(subcuenta))) == 1:
+            return f"0{int(subcuenta)}"
+        return str(int(subcuenta))
+    except Exception:
+        return np.nan
+
+
+def f_objeto(row):
+    objeto = row['OBJ']
+    try:
+        if len(str(int(objeto))) == 1:
+            return f"0{int(objeto)}"
+        return str(int(objeto))
+    except Exception:
+        return np.nan
+
+
+def f_ordinal(row):
+    ordinal = row['ORD']
+    try:
+        if len(str(int(ordinal))) == 1:
+            return f"00{int(ordinal)}"
+        elif len(str(int(ordinal))) == 2:
+            return f"0{int(ordinal)}"
+        return str(int(ordinal))
+    except Exception:
+        return np.nan
+
+
+def _valores(serie):
+    return [None if pd.isna(i) else i for i in serie]
+
+
+@pytest.fixture(scope='module')
+def libros():
+    partes, _ = etl.leer_libros(etl.libros_mensuales(os.path.join(RAIZ, etl.DATASETS)), 1)
+    return pd.concat(partes, ignore_index=True)
+
+
+@pytest.mark.parametrize('columna, ancho, original', [('CTA', 2, f_cuenta),
+                                                      ('SUB\nCTA', 2, f_subcuenta),
+                                                      ('OBJ', 2, f_objeto),
+                                                      ('ORD', 3, f_ordinal)])
+def test_codigo_igual_al_original(libros, columna, ancho, original):
+    esperado = libros.apply(original, axis=1)
+    assert _valores(codigo(libros[columna], ancho)) == _valores(esperado)
+
+
+def test_codigos_uej_iguales_al_original(libros):
+    esperado = pd.DataFrame({
+        'Código de entidad': libros['UEJ'].str.split('-').str[:2].str.join('').astype(int).astype(str),
+        'Código de sector': libros['UEJ'].str.split('-').str[0].astype(int).astype(str),
+        'Código de unidad': libros['UEJ'].str.split('-').str.join('').astype(int).astype(str),
+    })
+    obtenido = etl.normalizar_codigos(libros.copy())
+    for columna in esperado:
+        assert _valores(obtenido[columna]) == _valores(esperado[columna])
+
+
+def test_codigo_deja_nan_lo_que_no_es_entero():
+    resultado = codigo(pd.Series([1, None, 'x', '53105C', '20112E1', 7.0], dtype='object'), 3)
+    assert _valores(resultado) == ['001', None, None, None, None, '007']
+    assert resultado.notna().tolist() == [True, False, False, False, False, True]